@@ -7,20 +7,41 @@ __copyright__ = "(C) 2023-2026 Guido Draheim, all rights reserved"""
 __version__ = "1.1.3077"
 
 from typing import Union, Optional, Tuple, List, Dict, Iterator, Iterable, Any, cast, Sequence, Callable, NamedTuple
+from typing import Set, IO, Coroutine, TypeVar
 
 import os
 import os.path as fs
 import sys
 import re
+import json
+import functools
+import heapq
+import itertools
+import operator
+import math
+import struct
+import zlib
+import bisect
 import subprocess
+import tempfile
+import threading
+import time
+import resource
+import glob
+import queue
+import signal
+import weakref
 from datetime import date as Date
 from datetime import datetime as Time
 from collections import OrderedDict
+from array import array
 from fnmatch import fnmatchcase as fnmatch
+from fnmatch import translate
 import logging
 logg = logging.getLogger("CHECK")
 
 stringtypes = str  # pylint: disable=invalid-name
+T = TypeVar("T")  # the result of run_async
 
 try:
     from cStringIO import StringIO  # type: ignore[import, attr-defined]
@@ -30,13 +51,35 @@ except ImportError:
 REPO: Optional[str] = None
 GIT = "git"
 BRANCH = "main"
+REFS: List[str] = []  # for-each-ref patterns to scan instead of the BRANCH
+JOBS = 0  # parallel git processes (default cpu count)
+SHARDS = 0  # split the history of BRANCH into commit ranges traversed in parallel (0 = off)
+TIMEOUT = 0.0  # seconds for each repo in fleet mode
+FLEETTOP = 20
 PRETTY = False
 KEEP = False
 EXT = ""
 FMT = ""
+STREAM = False  # write the csv/tab/dat/jsonl rows as they are found
+TOP = 0  # only the largest rows of a report (0 = all)
+SORT = ""  # the column for TOP (default disksum)
 KB = 1024
 MB = KB * KB
 MAXSIZE: float = 50.0  # in MB
+LFSTARGET = 0.0  # the share of history that may remain after the lfs plan (0 = the densest plan)
+CACHE = False  # keep object sizes in $GIT_DIR
+INCREMENTAL = False  # keep the scan of history in $GIT_DIR and only add new commits
+PACKREAD = False  # read the object sizes from the pack files (loose objects are asked from git)
+CACHEFILE = "show-bigfiles.sqlite"
+PENDING = 10000  # objects in flight to cat-file
+CACHECHUNK = 500  # objects looked up in the size cache with one query
+STATS = False  # record wall/cpu time, bytes, objects and memory of each phase (see get_stats)
+STATSFILE = ""  # write the STATS json there instead of stderr
+STATSHOOK: Optional[Callable[[Dict[str, Any]], None]] = None  # called with the STATS json of a run
+SOCKET = "show-bigfiles.sock"  # where the serve daemon answers queries
+PORT = 0  # the serve daemon answers http on localhost too (0 = off)
+REFRESH = 10.0  # seconds between the checks of the ref tips in serve mode
+PERIOD = "month"  # the time buckets of the growth report (see PERIODS)
 
 
 def str_(obj: Any, no: str = '-') -> str:
@@ -57,6 +100,87 @@ def str_(obj: Any, no: str = '-') -> str:
     return text
 
 
+STATSDATA: Dict[str, Dict[str, float]] = OrderedDict()
+STATSLOCK = threading.Lock()
+STATSTIME = [time.monotonic(), time.process_time()]
+
+
+def add_stats(phase: str, **values: float) -> None:
+    """ add up the values of a phase for the STATS (the maxrss_kb values are a maximum) """
+    with STATSLOCK:
+        stats = STATSDATA.setdefault(phase, OrderedDict())
+        for name, value in values.items():
+            if name.startswith("maxrss"):
+                stats[name] = max(stats.get(name, 0), value)
+            else:
+                stats[name] = round(stats.get(name, 0) + value, 6)
+
+
+def get_phase(cmd: Union[str, List[str]]) -> str:
+    """ the git subcommand of a command line as the name of its phase """
+    found = re.search(r"\bgit\S*\s+(?:-\S+\s+)*([a-z][\w-]*)", cmd if isinstance(cmd, stringtypes) else " ".join(cmd))
+    return found.group(1) if found else "run"
+
+
+def reset_stats() -> None:
+    with STATSLOCK:
+        STATSDATA.clear()
+    STATSTIME[:] = [time.monotonic(), time.process_time()]
+
+
+def get_stats() -> Dict[str, Any]:
+    """ the STATS of the phases since the last reset_stats with the totals of the run """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    with STATSLOCK:
+        phases = OrderedDict((phase, OrderedDict(stats)) for phase, stats in STATSDATA.items())
+    return {"seconds": round(time.monotonic() - STATSTIME[0], 6), "cpu": round(time.process_time() - STATSTIME[1], 6),
+            "children_cpu": round(children.ru_utime + children.ru_stime, 6),
+            "maxrss_kb": usage.ru_maxrss, "children_maxrss_kb": children.ru_maxrss, "phases": phases}
+
+
+def write_stats() -> None:
+    """ the STATS json goes to the STATSFILE (or stderr) and to the STATSHOOK """
+    stats = get_stats()
+    if STATSHOOK is not None:
+        STATSHOOK(stats)
+    text = json.dumps(stats, indent=2)
+    if STATSFILE:
+        with open(STATSFILE, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text, file=sys.stderr)
+
+
+def each_timed(items: Iterable[Any], phase: str, consumer: str = "", counted: str = "objects") -> Iterator[Any]:
+    """ with STATS the time waiting for the items is added to the phase (counting the objects)
+        and the time between the items to the consumer phase. """
+    if not STATS:
+        yield from items
+        return
+    found = iter(items)
+    produced, consumed, count = 0.0, 0.0, 0
+    started = time.perf_counter()
+    try:
+        while True:
+            try:
+                item = next(found)
+            finally:
+                now = time.perf_counter()
+                produced += now - started
+            yield item
+            started = time.perf_counter()
+            consumed += started - now
+            count += 1
+    except StopIteration:
+        pass
+    finally:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        add_stats(phase, seconds=produced, maxrss_kb=maxrss, **{counted: count})
+        if consumer:
+            add_stats(consumer, seconds=consumed, maxrss_kb=maxrss)
+
+
 def decodes(text: Union[bytes, str]) -> str:
     if isinstance(text, bytes):
         encoded = sys.getdefaultencoding()
@@ -69,52 +193,173 @@ def decodes(text: Union[bytes, str]) -> str:
     return text  # works for None as well
 
 
-def output(cmd: Union[str, List[str]], cwd: Optional[str] = None, shell: bool = True, pipe: Optional[str] = None) -> str:
+def decodes_timed(text: bytes) -> str:
+    """ decodes with the time and bytes added to the STATS """
+    started = time.perf_counter()
+    result = decodes(text)
+    add_stats("decode", seconds=time.perf_counter() - started, bytes=len(text))
+    return result
+
+
+def spawn3(cmd: Union[str, List[str]], cwd: Optional[str] = None, shell: bool = True, pipe: Optional[str] = None,
+           stderr: bool = True, timeout: float = 0.0) -> Tuple[bytes, bytes, int]:
+    """ run a command to its end (stderr is passed through unless captured). After the timeout
+        the command is killed (with the children of the shell) and subprocess.TimeoutExpired is raised. """
     if isinstance(cmd, stringtypes):
         logg.info(": %s", cmd)
     else:
         logg.info(": %s", " ".join(["'%s'" % item for item in cmd]))
-    if pipe is not None:
-        run = subprocess.Popen(cmd, cwd=cwd, shell=shell,
-                               stdout=subprocess.PIPE, stdin=subprocess.PIPE)
-        out, err = run.communicate(pipe.encode("utf-8"))
-    else:
-        run = subprocess.Popen(cmd, cwd=cwd, shell=shell,
-                               stdout=subprocess.PIPE)
-        out, err = run.communicate()
+    started = time.monotonic()
+    run = subprocess.Popen(cmd, cwd=cwd, shell=shell, stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE if stderr else None,
+                           stdin=subprocess.PIPE if pipe is not None else None, start_new_session=bool(timeout))
+    try:
+        out, err = run.communicate(pipe.encode("utf-8") if pipe is not None else None, timeout=timeout or None)
+    except BaseException:
+        if timeout:
+            kill_group(run.pid)
+        run.kill()
+        run.communicate()
+        raise
+    if STATS:
+        add_stats(get_phase(cmd), seconds=time.monotonic() - started, bytes=len(out), calls=1)
+    return out, err or b"", run.returncode
+
+
+def kill_group(pid: int) -> None:
+    """ kill a command that was started in a new session - the shell does not always exec the git command """
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def output(cmd: Union[str, List[str]], cwd: Optional[str] = None, shell: bool = True, pipe: Optional[str] = None,
+           timeout: float = 0.0) -> str:
+    out, err, rc = spawn3(cmd, cwd, shell, pipe, stderr=False, timeout=timeout)
     return decodes(out)
 
 
-def output2(cmd: Union[str, List[str]], cwd: Optional[str] = None, shell: bool = True, pipe: Optional[str] = None) -> Tuple[str, int]:
+def output2(cmd: Union[str, List[str]], cwd: Optional[str] = None, shell: bool = True, pipe: Optional[str] = None,
+            timeout: float = 0.0) -> Tuple[str, int]:
+    out, err, rc = spawn3(cmd, cwd, shell, pipe, stderr=False, timeout=timeout)
+    return decodes(out), rc
+
+
+def output3(cmd: Union[str, List[str]], cwd: Optional[str] = None, shell: bool = True, pipe: Optional[str] = None,
+            timeout: float = 0.0) -> Tuple[str, str, int]:
+    out, err, rc = spawn3(cmd, cwd, shell, pipe, stderr=True, timeout=timeout)
+    return decodes(out), decodes(err), rc
+
+
+def each_split(stream: IO[bytes], sep: bytes) -> Iterator[bytes]:
+    """ the parts of a pipe up to and including each separator (as readline does for newlines) """
+    rest = b""
+    while True:
+        chunk = os.read(stream.fileno(), MB)
+        if not chunk:
+            break
+        parts = (rest + chunk).split(sep)
+        rest = parts.pop()
+        for part in parts:
+            yield part + sep
+    if rest:
+        yield rest
+
+
+def each_lines(cmd: Union[str, List[str]], cwd: Optional[str] = None, shell: bool = True,
+               sep: bytes = b"\n") -> Iterator[str]:
+    """ stream the output of a command line by line (without the newline) as it is produced - or
+        split at another separator like the NUL of the '-z' outputs of git """
     if isinstance(cmd, stringtypes):
         logg.info(": %s", cmd)
     else:
         logg.info(": %s", " ".join(["'%s'" % item for item in cmd]))
-    if pipe is not None:
-        run = subprocess.Popen(cmd, cwd=cwd, shell=shell,
-                               stdout=subprocess.PIPE, stdin=subprocess.PIPE)
-        out, err = run.communicate(pipe.encode("utf-8"))
-    else:
-        run = subprocess.Popen(cmd, cwd=cwd, shell=shell,
-                               stdout=subprocess.PIPE)
-        out, err = run.communicate()
-    return decodes(out), run.returncode
+    started = time.monotonic()
+    run = subprocess.Popen(cmd, cwd=cwd, shell=shell, stdout=subprocess.PIPE)
+    assert run.stdout is not None
+    decoding = decodes_timed if STATS else decodes
+    done = False
+    nbytes, lines = 0, 0
+    try:
+        for line in run.stdout if sep == b"\n" else each_split(run.stdout, sep):
+            nbytes += len(line)
+            lines += 1
+            yield decoding(line.rstrip(sep))
+        done = True
+    finally:
+        run.stdout.close()
+        if not done and run.poll() is None:
+            run.terminate()  # the consumer has stopped early
+        run.wait()
+        if STATS:
+            add_stats(get_phase(cmd), seconds=time.monotonic() - started, bytes=nbytes, lines=lines, calls=1)
+
+# ..............................................................
+# the async fleet runner lets the scans of many repos overlap. It only runs commands to their
+# end (output3_async) - the scan of one repo stays with the sync spawn3 and the threads of
+# each_parallel2 and each_catfile5. The asyncio import is deferred as it costs more than
+# the git calls of a pre-commit hook.
+
+
+ASYNCLIMITS: "weakref.WeakKeyDictionary[Any, Any]" = weakref.WeakKeyDictionary()
+
+
+def get_async_limit() -> Any:
+    """ the semaphore of the running event loop for JOBS concurrent commands """
+    import asyncio  # pylint: disable=import-outside-toplevel
+    loop = asyncio.get_running_loop()
+    if loop not in ASYNCLIMITS:
+        ASYNCLIMITS[loop] = asyncio.Semaphore(JOBS or os.cpu_count() or 1)
+    return ASYNCLIMITS[loop]
 
 
-def output3(cmd: Union[str, List[str]], cwd: Optional[str] = None, shell: bool = True, pipe: Optional[str] = None) -> Tuple[str, str, int]:
+async def start_async(cmd: Union[str, List[str]], cwd: Optional[str], shell: bool, stdin: bool, stderr: bool) -> Any:
+    import asyncio  # pylint: disable=import-outside-toplevel
     if isinstance(cmd, stringtypes):
         logg.info(": %s", cmd)
     else:
         logg.info(": %s", " ".join(["'%s'" % item for item in cmd]))
-    if pipe is not None:
-        run = subprocess.Popen(cmd, cwd=cwd, shell=shell, stdout=subprocess.PIPE,
-                               stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-        out, err = run.communicate(pipe.encode("utf-8"))
-    else:
-        run = subprocess.Popen(cmd, cwd=cwd, shell=shell,
-                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        out, err = run.communicate()
-    return decodes(out), decodes(err), run.returncode
+    pipes: Dict[str, Any] = dict(stdin=asyncio.subprocess.PIPE if stdin else None, stdout=asyncio.subprocess.PIPE,
+                                 stderr=asyncio.subprocess.PIPE if stderr else None, cwd=cwd, limit=MB,
+                                 start_new_session=True)  # see kill_group
+    if shell:
+        return await asyncio.create_subprocess_shell(cast(str, cmd), **pipes)
+    return await asyncio.create_subprocess_exec(*cmd, **pipes)
+
+
+async def output3_async(cmd: Union[str, List[str]], cwd: Optional[str] = None, shell: bool = True, pipe: Optional[str] = None,
+                        timeout: float = 0.0) -> Tuple[str, str, int]:
+    """ output3 for the async fleet runner - at most JOBS commands run at the same time. After the
+        timeout (or when cancelled) the command is killed, a timeout raises subprocess.TimeoutExpired. """
+    import asyncio  # pylint: disable=import-outside-toplevel
+    async with get_async_limit():
+        started = time.monotonic()
+        run = await start_async(cmd, cwd, shell, pipe is not None, True)
+        try:
+            data = pipe.encode("utf-8") if pipe is not None else None
+            out, err = await asyncio.wait_for(run.communicate(data), timeout or None)
+        except asyncio.TimeoutError:
+            raise subprocess.TimeoutExpired(cmd, timeout) from None
+        finally:
+            if run.returncode is None:
+                kill_group(run.pid)
+                await run.wait()
+        if STATS:
+            add_stats(get_phase(cmd), seconds=time.monotonic() - started, bytes=len(out), calls=1)
+        return decodes(out), decodes(err), run.returncode
+
+
+async def gather_async(coroutines: Iterable[Coroutine[Any, Any, T]]) -> List[T]:
+    """ run the coroutines concurrently (their commands are limited by get_async_limit) """
+    import asyncio  # pylint: disable=import-outside-toplevel
+    return list(await asyncio.gather(*coroutines))
+
+
+def run_async(coroutine: Coroutine[Any, Any, T]) -> T:
+    """ the sync bridge to the async runner (not from inside a running event loop) """
+    import asyncio  # pylint: disable=import-outside-toplevel
+    return asyncio.run(coroutine)
 
 
 def split2(inp: Iterable[str]) -> Iterator[Tuple[str, str]]:
@@ -168,6 +413,43 @@ ColSortList = Union[Sequence[str], Dict[str, str], Callable[[str], str]]
 LegendList = Union[Dict[str, str], Sequence[str]]
 
 
+def strJSON(value: JSONItem) -> str:
+    if value is None:
+        return "~"
+    if value is False:
+        return "(no)"
+    if value is True:
+        return "(yes)"
+    if isinstance(value, Time):
+        return value.strftime("%Y-%m-%d.%H%M")
+    if isinstance(value, Date):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+
+def jsonJSON(value: JSONItem) -> JSONItem:
+    return value if value is None or isinstance(value, (str, int, float)) else strJSON(value)
+
+
+def tabToCell(name: str, val: JSONItem, formats: Dict[str, str] = {}) -> str:
+    """ the cell text of tabToFMT and tabToStream - with a '{:...}' or '%s' format of the column """
+    if name in formats:
+        fmt = formats[name]
+        if "{:" in fmt:
+            try:
+                return fmt.format(val)
+            except (ValueError, TypeError) as e:
+                logg.debug("format <%s> does not apply: %s", fmt, e)
+        if "%s" in fmt:
+            try:
+                return fmt % strJSON(val)
+            except (ValueError, TypeError) as e:
+                logg.debug("format <%s> does not apply: %s", fmt, e)
+    if isinstance(val, float):
+        return "%4.2f" % val
+    return strJSON(val)
+
+
 def tabToFMT(fmt: str, result: JSONList, sorts: RowSortList = [], formats: Dict[str, str] = {}, *,  #
              datedelim: str = '-', legend: LegendList = [],  #
              reorder: ColSortList = [], combine: Dict[str, str] = {}) -> str:
@@ -183,10 +465,7 @@ def tabToFMT(fmt: str, result: JSONList, sorts: RowSortList = [], formats: Dict[
     if fmt in ["xls", "sxlx"]:
         tab = ','
     none_string = "~"
-    true_string = "(yes)"
-    false_string = "(no)"
     minwidth = 5
-    floatfmt = "%4.2f"
     noright = fmt in ["dat"]
     noheaders = fmt in ["text", "list"]
     formatright = re.compile("[{]:[^{}]*>[^{}]*[}]")
@@ -202,36 +481,6 @@ def tabToFMT(fmt: str, result: JSONList, sorts: RowSortList = [], formats: Dict[
                 return True
         return False
 
-    def format(name: str, val: JSONItem) -> str:  # pylint: disable=redefined-builtin
-        if name in formats:
-            fmt4 = formats[name]
-            if "{:" in fmt4:
-                try:
-                    return fmt4.format(val)
-                except (ValueError, TypeError) as e:
-                    logg.debug("format <%s> does not apply: %s", fmt, e)
-            if "%s" in fmt4:
-                try:
-                    return fmt % strJSON(val)
-                except (ValueError, TypeError) as e:
-                    logg.debug("format <%s> does not apply: %s", fmt, e)
-        if isinstance(val, float):
-            return floatfmt % val
-        return strJSON(val)
-
-    def strJSON(value: JSONItem) -> str:
-        if value is None:
-            return none_string
-        if value is False:
-            return false_string
-        if value is True:
-            return true_string
-        if isinstance(value, Time):
-            return value.strftime("%Y-%m-%d.%H%M")
-        if isinstance(value, Date):
-            return value.strftime("%Y-%m-%d")
-        return str(value)
-
     def asdict(item: JSONDict) -> JSONDict:
         if hasattr(item, "_asdict"):
             return item._asdict()  # type: ignore[attr-defined, union-attr, no-any-return, arg-type] # nopep8
@@ -240,10 +489,9 @@ def tabToFMT(fmt: str, result: JSONList, sorts: RowSortList = [], formats: Dict[
         return item
     cols: Dict[str, int] = {}
     for item in result:
-        for name, value in asdict(item).items():
+        for name in asdict(item):
             if name not in cols:
                 cols[name] = max(minwidth, len(name))
-            cols[name] = max(cols[name], len(format(name, value)))
 
     def sortkey(header: str) -> str:
         if callable(reorder):
@@ -282,22 +530,29 @@ def tabToFMT(fmt: str, result: JSONList, sorts: RowSortList = [], formats: Dict[
                 else:
                     sortvalue += "\n?"
             return sortvalue
+    colnames = sorted(cols.keys(), key=sortkey)
+    if fmt in ["jsonl"]:
+        return "".join(json.dumps(dict((name, jsonJSON(value)) for name, value in asdict(row).items())) + "\n"
+                       for row in sorted(result, key=sortrow))
+    # the cells are formatted once for the column widths and the output
+    rows: List[Dict[str, str]] = []
+    for row in sorted(result, key=sortrow):
+        rows.append(dict((name, tabToCell(name, value, formats)) for name, value in asdict(row).items()))
     # CSV
     if fmt in ["list", "csv", "scsv", "xlsx", "xls", "tab", "dat", "ifs", "data"]:
         tab1 = tab if tab else ";"
         import csv  # pylint: disable=import-outside-toplevel
         csvfile = StringIO()
-        writer = csv.DictWriter(csvfile, fieldnames=sorted(cols.keys(), key=sortkey),
+        writer = csv.DictWriter(csvfile, fieldnames=colnames,
                                 restval='~', quoting=csv.QUOTE_MINIMAL, delimiter=tab1)
         if not noheaders:
             writer.writeheader()
-        for row in sorted(result, key=sortrow):
-            rowvalues: Dict[str, str] = {}
-            for name, value in asdict(row).items():
-                rowvalues[name] = format(name, value)
-            writer.writerow(rowvalues)
+        writer.writerows(rows)
         return cast(str, csvfile.getvalue())
     # GFM
+    for values in rows:
+        for name, cell in values.items():
+            cols[name] = max(cols[name], len(cell))
 
     def rightF(col: str, formatter: str) -> str:
         if rightalign(col):
@@ -312,21 +567,55 @@ def tabToFMT(fmt: str, result: JSONList, sorts: RowSortList = [], formats: Dict[
     lines: List[str] = []
     if not noheaders:
         line = [rightF(name, tab2 + "%%-%is" % cols[name]) %
-                name for name in sorted(cols.keys(), key=sortkey)]
+                name for name in colnames]
         lines += [(" ".join(line)).rstrip()]
         if tab:
             seperators = [(tab2 + "%%-%is" % cols[name]) % rightS(name, "-" * cols[name])
-                          for name in sorted(cols.keys(), key=sortkey)]
+                          for name in colnames]
             lines.append(" ".join(seperators))
-    for item in sorted(result, key=sortrow):
-        values: Dict[str, str] = {}
-        for name, value in asdict(item).items():
-            values[name] = format(name, value)
-        line = [rightF(name, tab2 + "%%-%is" % cols[name]) % values.get(name, none_string)
-                for name in sorted(cols.keys(), key=sortkey)]
+    cellformats = [(name, rightF(name, tab2 + "%%-%is" % cols[name])) for name in colnames]
+    for values in rows:
+        line = [cellformat % values.get(name, none_string) for name, cellformat in cellformats]
         lines.append((" ".join(line)).rstrip())
     return "\n".join(lines) + "\n"
 
+
+def tabToStream(fmt: str, result: Iterable[JSONDict], sorts: Sequence[str] = [], formats: Dict[str, str] = {}, *,
+                reorder: Sequence[str] = [], out: Optional[IO[str]] = None) -> int:
+    """ write the csv/tab/dat/jsonl rows as they arrive (unsorted, without a width pass). The
+        columns are taken from the first row in the order of 'reorder' or 'sorts', and the
+        cells are the same as those of tabToFMT (see tabToCell). """
+    output = out if out is not None else sys.stdout
+    tab = "\t" if fmt in ["tabs", "tab", "dat", "ifs", "data"] else "," if fmt in ["xls", "sxlx"] else ";"
+    none_string = "~"
+    sortheaders = list(reorder or sorts)
+
+    def asdict(item: JSONDict) -> JSONDict:
+        if hasattr(item, "_asdict"):
+            return item._asdict()  # type: ignore[attr-defined, union-attr, no-any-return, arg-type] # nopep8
+        if isinstance(item, stringtypes):
+            return {"value": item}
+        return item
+    import csv  # pylint: disable=import-outside-toplevel
+    writer: Optional[csv.DictWriter[str]] = None
+    count = 0
+    for item in result:
+        row = asdict(item)
+        if fmt in ["jsonl"]:
+            output.write(json.dumps(dict((name, jsonJSON(value)) for name, value in row.items())) + "\n")
+        else:
+            if writer is None:
+                colnames = sorted(row.keys(),
+                                  key=lambda name: "%07i" % sortheaders.index(name) if name in sortheaders else name)
+                writer = csv.DictWriter(output, fieldnames=colnames, restval=none_string,
+                                        quoting=csv.QUOTE_MINIMAL, delimiter=tab)
+                if fmt not in ["text", "list"]:
+                    writer.writeheader()
+            writer.writerow(dict((name, tabToCell(name, value, formats)) for name, value in row.items()))
+        count += 1
+    output.flush()
+    return count
+
 # ..............................................................
 
 
@@ -348,13 +637,13 @@ class Committer2(NamedTuple):
 
 
 def each_mail2() -> Iterator[Union[Author2, Committer2]]:
-    emails: List[str] = []
+    emails: Set[str] = set()
     for mail in each_author4():
         if mail.author not in emails:
-            emails.append(mail.author)
+            emails.add(mail.author)
             yield Author2(mail.author, mail.authorname)
-        if mail.committer not in mail:
-            emails.append(mail.committer)
+        if mail.committer not in emails:
+            emails.add(mail.committer)
             yield Committer2(mail.committer, mail.committername)
 
 
@@ -384,6 +673,92 @@ class HistSize5(NamedTuple):
     name: str
 
 
+class Inventory:
+    """ a compact store of sized objects - the columns are arrays with binary object ids and
+        the path names are interned into a path table. Iterating yields HistSize5 items. """
+    def __init__(self, items: Iterable[HistSize5] = ()) -> None:
+        self.hashsize = 0
+        self.revs = bytearray()
+        self.types = array("B")
+        self.disksizes = array("q")
+        self.filesizes = array("q")
+        self.names = array("I")
+        self.typenames: List[str] = []
+        self.typeids: Dict[str, int] = {}
+        self.paths: List[str] = []
+        self.pathids: Dict[str, int] = {}
+        for item in items:
+            self.add(item)
+    def intern(self, name: str) -> int:
+        pathid = self.pathids.get(name)
+        if pathid is None:
+            pathid = self.pathids[name] = len(self.paths)
+            self.paths.append(name)
+        return pathid
+    def add(self, item: HistSize5) -> None:
+        rev, typ, disk, size, name = item
+        if not self.hashsize:
+            self.hashsize = len(rev) // 2
+        self.revs += bytes.fromhex(rev)
+        typeid = self.typeids.get(typ)
+        if typeid is None:
+            typeid = self.typeids[typ] = len(self.typenames)
+            self.typenames.append(typ)
+        self.types.append(typeid)
+        self.disksizes.append(disk)
+        self.filesizes.append(size)
+        self.names.append(self.intern(name))
+    def rev(self, index: int) -> str:
+        return self.revs[index * self.hashsize:(index + 1) * self.hashsize].hex()
+    def name(self, index: int) -> str:
+        return self.paths[self.names[index]]
+    def __len__(self) -> int:
+        return len(self.types)
+    def __getitem__(self, index: int) -> HistSize5:
+        if index < 0:
+            index += len(self.types)
+        return HistSize5(self.rev(index), self.typenames[self.types[index]],
+                         self.disksizes[index], self.filesizes[index], self.name(index))
+    def __iter__(self) -> Iterator[HistSize5]:
+        for index in range(len(self.types)):
+            yield self[index]
+    def nbytes(self) -> int:
+        """ the memory of the columns (without the path table) """
+        columns = [self.types, self.disksizes, self.filesizes, self.names]
+        return len(self.revs) + sum(len(column) * column.itemsize for column in columns)
+
+
+TOPSORTS = ["disksum", "filesum", "changes"]
+
+
+def each_top(items: Iterable[Any], top: int = 0, sort: str = "") -> Iterator[Any]:
+    """ the top largest items by a bounded heap (instead of a full sort) - with top=0 all items in
+        their order. The sort may be disksum, filesum or changes (disksize and filesize for objects). """
+    if not top:
+        yield from items
+        return
+    found = iter(items)
+    first = next(found, None)
+    if first is None:
+        return
+    sort = sort or TOPSORTS[0]
+    fields = list(first) if isinstance(first, dict) else getattr(first, "_fields", ())
+    names = [name for name in [sort, sort.replace("sum", "size"), sort.replace("size", "sum")] if name in fields]
+    if not names:
+        logg.warning("can not sort by %s: %s", sort, fields)
+        yield first
+        yield from found
+        return
+    key = operator.itemgetter(names[0]) if isinstance(first, dict) else operator.attrgetter(names[0])
+    yield from heapq.nlargest(top, itertools.chain([first], found), key=key)
+
+
+def get_inventory(filtered: str = "") -> Inventory:
+    inventory = Inventory(each_size5(filtered))
+    logg.info("inventory of %s objects with %s paths in %s bytes", len(inventory), len(inventory.paths), inventory.nbytes())
+    return inventory
+
+
 def get_rev_list() -> str:
     return "\n".join(" ".join([str_(elem) for elem in item]) for item in each_size5())
 
@@ -392,40 +767,793 @@ def get_sizes() -> str:
     return "\n".join(" ".join([str_(elem) for elem in item]) for item in each_size5())
 
 
-def each_size5() -> Iterator[HistSize5]:
-    git, main = GIT, BRANCH
-    out = output(F"{git} rev-list {main} --objects", REPO)
-    revs: Dict[str, str] = OrderedDict()
-    disks: Dict[str, int] = {}
-    sizes: Dict[str, int] = {}
-    types: Dict[str, str] = {}
-    for rev, name in splits2(out):
-        logg.debug("FOUND %s %s", rev, name)
-        revs[rev] = name
-    objectnames = "\n".join(revs.keys()) + "\n"
-    logg.debug("objectnames => %s", objectnames)
-    siz = output(F"{git} cat-file --batch-check='%(objectsize:disk) %(objectsize) %(objecttype) %(objectname)'",
-                 REPO, pipe=objectnames)
-    logg.debug("cat-file => %s", siz)
-    for disk1, size1, type1, rev in splits4(siz):
-        disks[rev] = int(disk1)
-        sizes[rev] = int(size1)
-        types[rev] = type1
-    for rev in revs:
-        nam = revs[rev]
-        dsk = disks[rev]
-        sze = sizes[rev]
-        typ = types[rev]
-        yield HistSize5(rev, typ, dsk, sze, nam)
+BLOBS = "blobs"  # each_size5 without trees
+OVERSIZE = "oversize"  # each_size5 with only the blobs over MAXSIZE
+
+
+def each_size5(filtered: str = "", top: int = 0, sort: str = "",
+               deltabases: Optional[Dict[str, str]] = None) -> Iterator[HistSize5]:
+    """ the objects in history - filtered BLOBS has no trees and OVERSIZE has only the blobs
+        over MAXSIZE, where the filters are pushed down to git so that less is sized. """
+    if top:
+        return each_top(each_size5(filtered, deltabases=deltabases), top, sort)
+    if REFS:
+        if SHARDS > 1:
+            logg.warning("--shards is for the branch only - the refs are traversed in parallel instead")
+        return each_refsize5(get_refs(REFS), filtered, deltabases)
+    if SHARDS > 1:
+        return each_shardsize5(BRANCH, filtered, deltabases)
+    return each_revsize5(BRANCH, filtered, deltabases)
+
+
+def each_revsize5(revs: str, filtered: str = "", deltabases: Optional[Dict[str, str]] = None) -> Iterator[HistSize5]:
+    return each_revssize5([revs.split()], filtered, deltabases=deltabases)
+
+
+def each_shardsize5(revs: str, filtered: str = "", deltabases: Optional[Dict[str, str]] = None) -> Iterator[HistSize5]:
+    """ the objects in history with the commits split into SHARDS ranges of the rev-list order. Each
+        range is traversed by its own git process (without walking) and the listings are merged in
+        order with each object only once - so the result is the same as that of one rev-list. The
+        revs must name a single commit (a range like 'a..b' is traversed by one rev-list).
+        There are no more shards than JOBS, and the names are still parsed and merged in this
+        one process - so the shards only gain where git's traversal is the larger part and there
+        are idle cpus. On a single cpu --shards keeps the result and changes nothing else. """
+    git = GIT
+    count = min(SHARDS, JOBS or os.cpu_count() or 1)
+    if count < 2:
+        logg.info("--shards %s with %s jobs - traversing without shards", SHARDS, JOBS or os.cpu_count())
+        return each_revsize5(revs, filtered, deltabases)
+    tip, rc = output2(F"{git} rev-parse --verify --quiet '{revs}^{{commit}}'", REPO)
+    if rc or len(tip.split()) != 1:
+        logg.warning("--shards needs a single commit (not '%s') - traversing without shards", revs)
+        return each_revsize5(revs, filtered, deltabases)
+    commits = output(F"{git} rev-list {tip.strip()}", REPO).split()
+    size = max(1, -(-len(commits) // count))
+    shards = [commits[start:start + size] for start in range(0, len(commits), size)]
+    logg.info("history of %s commits in %s shards", len(commits), len(shards))
+    return each_revssize5(shards, filtered, "--no-walk=unsorted", deltabases=deltabases)
+
+
+def each_refsize5(refs: List[str], filtered: str = "", deltabases: Optional[Dict[str, str]] = None) -> Iterator[HistSize5]:
+    """ the objects in the history of all the refs. The refs are traversed by parallel git
+        processes while each object is sized only once in a single cat-file batch. """
+    jobs = min(JOBS or os.cpu_count() or 1, len(refs))
+    return each_revssize5([refs[job::jobs] for job in range(jobs)], filtered, deltabases=deltabases)
+
+
+def each_revssize5(groups: List[List[str]], filtered: str = "", exclude: str = "",
+                   deltabases: Optional[Dict[str, str]] = None) -> Iterator[HistSize5]:
+    """ the objects in the history of each group of revs (traversed in parallel) - the exclude
+        options are given to rev-list after the revs, e.g. '--not --all' for new objects only
+        or '--no-walk=unsorted' for the commit ranges of each_shardsize5.
+        With a deltabases dict the delta base of each deltified object is stored there. """
+    git = GIT
+    version = get_git_version()
+    blobs = "--filter=object:type=blob" if filtered and version >= (2, 32) else ""
+    if filtered == OVERSIZE and version >= (2, 19):
+        # the blobs over the limit are omitted by git (printed without names) ...
+        limit = int(math.ceil(MAXSIZE * MB))
+        allrevs = "\n".join(rev for group in groups for rev in group) + "\n"
+        omitting = F"--filter=blob:limit={limit} --filter-print-omitted --quiet"
+        omitted = output(F"{git} rev-list --objects {omitting} --stdin {exclude}", REPO, pipe=allrevs)
+        wanted = set(line[1:] for line in omitted.splitlines() if line.startswith("~"))
+        logg.info("found %s blobs over %s MB", len(wanted), MAXSIZE)
+        if not wanted:
+            return iter([])
+        # ... and only those are named and sized
+        cmds = [(F"{git} rev-list --objects {blobs} --stdin {exclude}", "\n".join(group) + "\n") for group in groups]
+        return each_objsize5(each_wanted2(each_parallel2(cmds), wanted), deltabases)
+    cmds = [(F"{git} rev-list --objects {blobs} --stdin {exclude}", "\n".join(group) + "\n") for group in groups]
+    return each_objsize5(each_parallel2(cmds), deltabases)
+
+
+def each_prereceive5(lines: Iterable[str]) -> Iterator[HistSize5]:
+    """ the blobs over MAXSIZE in a push - from the 'oldrev newrev refname' lines of a pre-receive
+        hook. Only the pushed commits are walked as everything reachable from the existing refs
+        is excluded, and the few new candidates are sized in one cat-file batch. """
+    revs: List[str] = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 3:
+            continue
+        old, new, ref = parts[:3]
+        if not new.strip("0"):
+            continue  # deleted ref
+        revs.append(new)
+        if old.strip("0"):
+            revs.append("^" + old)
+    if not revs:
+        return
+    for rev, typ, disk, size, name in each_revssize5([revs], OVERSIZE, "--not --all"):
+        if size >= MAXSIZE * MB:  # without the pushdown of git 2.19 all new objects are listed
+            yield HistSize5(rev, typ, disk, size, name)
+
+
+def get_prereceive(lines: Iterable[str]) -> Tuple[str, int]:
+    """ the report and exit code for a pre-receive hook """
+    found = list(each_prereceive5(lines))
+    if not found:
+        return "", 0
+    report = [F"*** rejected: {len(found)} files over {MAXSIZE} MB (use git lfs)"]
+    for item in found:
+        report.append("*** %8.1f MB %s (%s)" % (item.filesize / MB, item.name, item.rev[:12]))
+    return "\n".join(report), 1
+
+
+def each_staged2() -> Iterator[Tuple[str, str]]:
+    """ the (rev, name) of the blobs added or modified in the index (deletions and submodules are skipped) """
+    git = GIT
+    raw = output(F"{git} diff --cached --raw -z --no-abbrev --no-renames", REPO)
+    parts = raw.split("\0")
+    for num in range(0, len(parts) - 1, 2):
+        meta, name = parts[num].split(), parts[num + 1]
+        if len(meta) < 5 or meta[1] in ["000000", "160000"]:
+            continue
+        yield meta[3], name
+
+
+def each_staged5() -> Iterator[HistSize5]:
+    """ the staged blobs over MAXSIZE (and with -E the staged blobs of those extensions) - only
+        the index is read and its few objects are sized in one cat-file batch, history is never
+        walked. This is fast enough for a pre-commit hook. """
+    staged = list(each_staged2())
+    if not staged:
+        return
+    extlist = EXT.split(",") if EXT else []
+    for rev, typ, disk, size, name in each_catfile5(staged):
+        if size >= MAXSIZE * MB:
+            yield HistSize5(rev, typ, disk, size, name)
+            continue
+        nam, ext = map_splitext(name)
+        for pat in extlist:
+            if fnmatch(ext, pat):
+                yield HistSize5(rev, typ, disk, size, name)
+                break
+
+
+def get_staged() -> Tuple[str, int]:
+    """ the report and exit code for a pre-commit hook """
+    found = list(each_staged5())
+    if not found:
+        return "", 0
+    rules = F"over {MAXSIZE} MB or with -E '{EXT}'" if EXT else F"over {MAXSIZE} MB"
+    report = [F"*** rejected: {len(found)} staged files {rules} (use git lfs)"]
+    for item in found:
+        report.append("*** %8.1f MB %s (%s)" % (item.filesize / MB, item.name, item.rev[:12]))
+    return "\n".join(report), 1
+
+
+def each_wanted2(objects: Iterable[Tuple[str, str]], wanted: Set[str]) -> Iterator[Tuple[str, str]]:
+    """ only the wanted objects (stopping the listing when all have been seen) """
+    wanted = set(wanted)
+    for rev, name in objects:
+        if rev in wanted:
+            yield rev, name
+            wanted.remove(rev)
+            if not wanted:
+                break
+
+
+GITVERSIONS: Dict[str, Tuple[int, ...]] = {}
+
+
+def get_git_version() -> Tuple[int, ...]:
+    git = GIT
+    if git not in GITVERSIONS:
+        found = re.search(r"(\d+)[.](\d+)", output(F"{git} version"))
+        GITVERSIONS[git] = (int(found.group(1)), int(found.group(2))) if found else (0, 0)
+        logg.debug("git version %s", GITVERSIONS[git])
+    return GITVERSIONS[git]
+
+
+def get_refs(patterns: List[str]) -> List[str]:
+    git = GIT
+    pattern = " ".join(["'%s'" % pat for pat in patterns])
+    return output(F"{git} for-each-ref --format='%(refname)' {pattern}", REPO).split()
+
+
+def each_parallel2(cmds: List[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+    """ run the (cmd, stdin) object listings concurrently and yield their (rev, name) in the order
+        of the commands, each object only once. The first command is streamed while the others
+        are spooled to temporary files until their turn has come. """
+    runs: List[Tuple[subprocess.Popen[bytes], Optional[IO[bytes]]]] = []
+    decoding = decodes_timed if STATS else decodes
+    started = time.monotonic()
+    nbytes = 0
+    def each_line(lines: IO[bytes]) -> Iterator[str]:
+        nonlocal nbytes
+        for line in lines:
+            nbytes += len(line)  # the bytes from git (not the decoded length)
+            yield decoding(line.rstrip(b"\n"))
+    try:
+        for num, (cmd, stdin) in enumerate(cmds):
+            logg.info(": %s", cmd)
+            spooled: Optional[IO[bytes]] = tempfile.TemporaryFile() if num else None
+            run = subprocess.Popen(cmd, cwd=REPO, shell=True, stdin=subprocess.PIPE,
+                                   stdout=spooled if spooled is not None else subprocess.PIPE)
+            assert run.stdin is not None
+            run.stdin.write(stdin.encode("utf-8"))
+            run.stdin.close()
+            runs.append((run, spooled))
+        seen: Set[str] = set()
+        for run, spool in runs:
+            if spool is None:
+                assert run.stdout is not None
+                lines: IO[bytes] = run.stdout
+            else:
+                run.wait()
+                spool.seek(0)
+                lines = spool
+            for rev, name in split2(each_line(lines)):
+                if rev in seen:
+                    continue
+                if len(runs) > 1:
+                    seen.add(rev)
+                yield rev, name
+            run.wait()
+    finally:
+        for run, spool in runs:
+            if run.stdout is not None:
+                run.stdout.close()
+            if run.poll() is None:
+                run.terminate()  # the consumer has stopped early
+            run.wait()
+            if spool is not None:
+                spool.close()
+        if STATS and runs:
+            add_stats(get_phase(cmds[0][0]), seconds=time.monotonic() - started, bytes=nbytes, calls=len(runs))
+
+
+def each_objsize5(objects: Iterable[Tuple[str, str]], deltabases: Optional[Dict[str, str]] = None) -> Iterator[HistSize5]:
+    if deltabases is not None:  # only cat-file knows them
+        yield from each_catfile5(objects, deltabases=deltabases)
+        return
+    sizer = SIZERS.get(fs.abspath(REPO or "."))
+    if sizer is not None:
+        yield from sizer.sizes(objects)
+        return
+    cache = open_cache()
+    packs = open_packs()
+    try:
+        for item in each_catfile5(objects, cache, packs):
+            yield item
+    finally:
+        if cache is not None:
+            cache.close()
+        if packs is not None:
+            packs.close()
+
+
+def each_catfile5(objects: Iterable[Tuple[str, str]], cache: Optional["SizeCache"] = None,
+                  packs: Optional["PackReader"] = None, deltabases: Optional[Dict[str, str]] = None) -> Iterator[HistSize5]:
+    """ size the (rev, name) objects with a single git cat-file --batch-check. The objects
+        are fed to cat-file from a thread while the results are read back, so that nothing
+        is buffered beyond the pipes and the first item can be yielded right away. Objects
+        that are found in the pack files or in the cache are not sent to cat-file at all
+        (the cache is asked for CACHECHUNK objects at a time).
+        With a deltabases dict the %(deltabase) of each deltified object is stored there. """
+    git = GIT
+    deltabase = " %(deltabase)" if deltabases is not None else ""
+    cmd = F"{git} cat-file --batch-check='%(objectsize:disk) %(objectsize) %(objecttype) %(objectname){deltabase}'"
+    logg.info(": %s", cmd)
+    started = time.monotonic()
+    run = subprocess.Popen(cmd, cwd=REPO, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    assert run.stdin is not None and run.stdout is not None
+    stdin, stdout = run.stdin, run.stdout
+    decoding = decodes_timed if STATS else decodes
+    waiting, nbytes, asked, nknown = 0.0, 0, 0, 0
+    pending: "queue.Queue[Optional[Tuple[str, str, Optional[HistSize5]]]]" = queue.Queue(PENDING)
+    stopped = threading.Event()
+
+    def each_known() -> Iterator[Tuple[str, str, Optional[HistSize5]]]:
+        if cache is None:
+            for rev, name in objects:
+                yield rev, name, packs.get(rev, name) if packs is not None else None
+            return
+        listed = iter(objects)
+        while not stopped.is_set():
+            chunk = [(rev, name, packs.get(rev, name) if packs is not None else None)
+                     for rev, name in itertools.islice(listed, CACHECHUNK)]
+            if not chunk:
+                break
+            cached = cache.lookup([rev for rev, name, known in chunk if known is None])
+            for rev, name, known in chunk:
+                if known is None and rev in cached:
+                    typ, disk, size = cached[rev]
+                    known = HistSize5(rev, typ, disk, size, name)
+                yield rev, name, known
+
+    def feed() -> None:
+        try:
+            for rev, name, known in each_known():
+                if stopped.is_set():
+                    break
+                logg.debug("FOUND %s %s", rev, name)
+                try:
+                    pending.put_nowait((rev, name, known))
+                except queue.Full:
+                    stdin.flush()  # cat-file answers everything that is waited for
+                    pending.put((rev, name, known))
+                if known is None:
+                    stdin.write(rev.encode("utf-8") + b"\n")
+        except (BrokenPipeError, ValueError) as e:  # cat-file was stopped
+            logg.debug("feed cat-file: %s", e)
+        finally:
+            closing = getattr(objects, "close", None)
+            if closing is not None:
+                closing()
+            try:
+                stdin.close()
+            except BrokenPipeError:
+                pass
+            pending.put(None)
+    feeder = threading.Thread(target=feed, name="cat-file-feed", daemon=True)
+    feeder.start()
+    done = False
+    try:
+        while True:
+            pending_item = pending.get()
+            if pending_item is None:
+                break
+            rev, name, found = pending_item
+            if found is not None:
+                nknown += 1
+                yield found
+                continue
+            reading = time.perf_counter()
+            line = stdout.readline()
+            waiting += time.perf_counter() - reading
+            nbytes += len(line)
+            asked += 1
+            if not line:
+                logg.error("cat-file has stopped early")
+                break
+            parts = decoding(line).split(" ", 4)
+            if len(parts) < 4:
+                logg.warning("can not size %s: %s", rev, decodes(line).rstrip())
+                continue
+            item = HistSize5(rev, parts[2], int(parts[0]), int(parts[1]), name)
+            if deltabases is not None and len(parts) > 4 and parts[4].strip("0\n"):
+                deltabases[rev] = parts[4].rstrip("\n")
+            if cache is not None:
+                cache.put(item)
+            yield item
+        done = True
+    finally:
+        stopped.set()
+        stdout.close()
+        if not done and run.poll() is None:
+            run.terminate()  # the consumer has stopped early
+        while feeder.is_alive():
+            try:  # unblock the feeder
+                pending.get_nowait()
+            except queue.Empty:
+                feeder.join(0.01)
+        run.wait()
+        if STATS:
+            add_stats("cat-file", seconds=time.monotonic() - started, wait=waiting, bytes=nbytes,
+                      objects=asked, known=nknown, calls=1)
+
+
+SIZERCACHE = 100000  # objects remembered by a GitObjectSizer
+SIZERCHUNK = 500  # objects per round trip to its cat-file
+SIZERDIRECT = 100  # objects whose answers fit into any pipe buffer (more are written by a feeder thread)
+SIZERS: Dict[str, "GitObjectSizer"] = {}  # the open sizers per repo (used by each_objsize5)
+
+
+class GitObjectSizer:
+    """ a long-lived git cat-file --batch-check of a repo for library use. The objects are asked
+        one at a time or in chunks, and the answers are kept in an LRU. While it is open as a context
+        manager the each_* functions of the same repo use it instead of starting their own cat-file.
+        Note that a loose object gets a different disksize when packed (use clear after a gc). """
+    def __init__(self, repo: Optional[str] = None, cachesize: int = SIZERCACHE, chunk: int = SIZERCHUNK) -> None:
+        self.repo = repo if repo is not None else REPO
+        self.cachesize = cachesize
+        self.chunk = chunk
+        self.cache: "OrderedDict[str, Tuple[str, int, int, str]]" = OrderedDict()
+        self.run: Optional[subprocess.Popen[bytes]] = None
+        self.lock = threading.RLock()
+        self.hits, self.asked = 0, 0
+    def __enter__(self) -> "GitObjectSizer":
+        SIZERS[fs.abspath(self.repo or ".")] = self
+        return self
+    def __exit__(self, *exc: Any) -> None:
+        if SIZERS.get(fs.abspath(self.repo or ".")) is self:
+            del SIZERS[fs.abspath(self.repo or ".")]
+        self.close()
+    def start(self) -> "subprocess.Popen[bytes]":
+        if self.run is None or self.run.poll() is not None:
+            git = GIT
+            cmd = F"{git} cat-file --batch-check='%(objectsize:disk) %(objectsize) %(objecttype) %(objectname)'"
+            logg.info(": %s", cmd)
+            self.run = subprocess.Popen(cmd, cwd=self.repo, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        return self.run
+    def ask(self, revs: List[str]) -> List[Optional[Tuple[str, int, int, str]]]:
+        """ one round trip - the (typ, disksize, filesize, objectname) of each rev (None when missing) """
+        run = self.start()
+        assert run.stdin is not None and run.stdout is not None
+        started = time.monotonic()
+        stdin, data = run.stdin, "".join(rev + "\n" for rev in revs).encode("utf-8")
+        def feed() -> None:
+            try:
+                stdin.write(data)
+                stdin.flush()
+            except (BrokenPipeError, ValueError) as e:  # cat-file was stopped
+                logg.debug("feed cat-file: %s", e)
+        feeder: Optional[threading.Thread] = None
+        if len(revs) <= SIZERDIRECT:
+            feed()
+        else:  # cat-file blocks on its full stdout while we would block on its full stdin
+            feeder = threading.Thread(target=feed, name="cat-file-feed", daemon=True)
+            feeder.start()
+        found: List[Optional[Tuple[str, int, int, str]]] = []
+        nbytes = 0
+        for rev in revs:
+            line = run.stdout.readline()
+            nbytes += len(line)
+            if not line:
+                raise OSError("cat-file has stopped")
+            parts = decodes(line).split(" ")
+            if len(parts) < 4:
+                logg.debug("can not size %s: %s", rev, decodes(line).rstrip())
+                found.append(None)
+                continue
+            found.append((parts[2], int(parts[0]), int(parts[1]), parts[3].rstrip("\n")))
+        if feeder is not None:
+            feeder.join()
+        self.asked += len(revs)
+        if STATS:
+            add_stats("cat-file", seconds=time.monotonic() - started, bytes=nbytes, objects=len(revs), calls=1)
+        return found
+    def sizes(self, objects: Iterable[Tuple[str, str]]) -> Iterator[HistSize5]:
+        """ the (rev, name) objects sized in chunks (missing objects are skipped) """
+        found = iter(objects)
+        while True:
+            chunk = list(itertools.islice(found, self.chunk))
+            if not chunk:
+                break
+            yield from self.sizes_chunk(chunk)
+    def sizes_chunk(self, objects: List[Tuple[str, str]]) -> List[HistSize5]:
+        with self.lock:
+            wanted = list(OrderedDict.fromkeys(rev for rev, name in objects if rev not in self.cache))
+            if wanted:
+                for rev, answer in zip(wanted, self.ask(wanted)):
+                    if answer is not None:
+                        self.cache[rev] = answer
+            self.hits += len(objects) - len(wanted)
+            result = []
+            for rev, name in objects:
+                known = self.cache.get(rev)
+                if known is not None:
+                    self.cache.move_to_end(rev)  # most recently used
+                    result.append(HistSize5(known[3], known[0], known[1], known[2], name))
+            while len(self.cache) > self.cachesize:
+                self.cache.popitem(last=False)
+            return result
+    def get(self, rev: str, name: str = "") -> Optional[HistSize5]:
+        found = self.sizes_chunk([(rev, name)])
+        return found[0] if found else None
+    def clear(self) -> None:
+        with self.lock:
+            self.cache.clear()
+    def close(self) -> None:
+        with self.lock:
+            if self.run is not None:
+                assert self.run.stdin is not None and self.run.stdout is not None
+                self.run.stdin.close()
+                self.run.stdout.close()
+                self.run.wait()
+                self.run = None
+
+
+def get_gitdir() -> str:
+    git = GIT
+    gitdir = output(F"{git} rev-parse --git-dir", REPO).strip()
+    if REPO and not fs.isabs(gitdir):
+        return fs.join(REPO, gitdir)
+    return gitdir
+
+
+def open_cache() -> Optional["SizeCache"]:
+    if not CACHE:
+        return None
+    return SizeCache(fs.join(get_gitdir(), CACHEFILE), fs.join(get_gitdir(), "objects"))
+
+
+class SizeCache:
+    """ sqlite file with the cat-file results per object id and the pack that holds it.
+        Loose objects are not cached at all (not even their type and size) as a loose object
+        gets a different disksize when it is packed later - so a repo that is never packed
+        gains nothing from the cache. When a pack is gone (git gc, git repack) then only the
+        objects of that pack are dropped. The lookups are done in chunks (see lookup) and the
+        pack of the new objects is found in the pack indexes when they are written. """
+    def __init__(self, filename: str, objects: str) -> None:
+        import sqlite3  # pylint: disable=import-outside-toplevel
+        self.filename = filename
+        self.objects = objects
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(sizes)")]
+        if columns and "pack" not in columns:
+            logg.info("old cache format, dropping %s", filename)
+            self.conn.execute("DROP TABLE sizes")
+        self.conn.execute("DROP TABLE IF EXISTS packs")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS sizes (rev TEXT PRIMARY KEY, typ TEXT, disk INTEGER, size INTEGER,"
+                          " pack TEXT)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sizes_pack ON sizes (pack)")
+        self.conn.execute("CREATE TEMP TABLE wanted (rev TEXT PRIMARY KEY)")
+        packdir = fs.join(objects, "pack")
+        packs = [name for name in os.listdir(packdir) if name.endswith(".pack")] if fs.isdir(packdir) else []
+        gone = [row[0] for row in self.conn.execute("SELECT DISTINCT pack FROM sizes") if row[0] not in packs]
+        if gone:
+            logg.info("%s packs are gone, dropping their objects from %s", len(gone), filename)
+            self.conn.executemany("DELETE FROM sizes WHERE pack = ?", [(pack,) for pack in gone])
+        self.conn.commit()
+        self.packnames = packs
+        self.packs: Optional[List[PackFile]] = None  # opened on the first flush
+        self.added: List[Tuple[str, str, int, int]] = []
+    def lookup(self, revs: List[str]) -> Dict[str, Tuple[str, int, int]]:
+        """ the (type, disksize, filesize) of the cached objects - in one query for all revs """
+        if not revs:
+            return {}
+        with self.lock:
+            self.conn.executemany("INSERT OR IGNORE INTO wanted VALUES (?)", [(rev,) for rev in revs])
+            found = dict((rev, (typ, disk, size)) for rev, typ, disk, size in self.conn.execute(
+                "SELECT sizes.rev, typ, disk, size FROM wanted JOIN sizes ON sizes.rev = wanted.rev"))
+            self.conn.execute("DELETE FROM wanted")
+            self.conn.commit()
+        return found
+    def get(self, rev: str, name: str = "") -> Optional[HistSize5]:
+        found = self.lookup([rev])
+        if rev not in found:
+            return None
+        typ, disk, size = found[rev]
+        return HistSize5(rev, typ, disk, size, name)
+    def put(self, item: HistSize5) -> None:
+        self.added.append((item.rev, item.typ, item.disksize, item.filesize))
+        if len(self.added) >= PENDING:
+            self.flush()
+    def packof(self, rev: str) -> Optional[str]:
+        """ the pack file name that has the object (None for a loose object) """
+        if self.packs is None:
+            hashsize = len(rev) // 2
+            packdir = fs.join(self.objects, "pack")
+            self.packs = [PackFile(fs.join(packdir, name[:-len(".pack")] + ".idx"), hashsize) for name in self.packnames]
+        sha = bytes.fromhex(rev)
+        for pack in self.packs:
+            if pack.find(sha) >= 0:
+                return fs.basename(pack.packfile)
+        return None
+    def flush(self) -> None:
+        rows = []
+        for rev, typ, disk, size in self.added:
+            pack = self.packof(rev)
+            if pack is not None:  # not a loose object
+                rows.append((rev, typ, disk, size, pack))
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO sizes VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.commit()
+        self.added = []
+    def close(self) -> None:
+        self.flush()
+        for pack in self.packs or []:
+            pack.close()
+        self.conn.close()
+
+
+def open_packs() -> Optional["PackReader"]:
+    if not PACKREAD:
+        return None
+    git = GIT
+    hashsize = 32 if output(F"{git} rev-parse --show-object-format", REPO).strip() == "sha256" else 20
+    return PackReader(fs.join(get_gitdir(), "objects"), hashsize)
+
+
+PACKTYPES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+OFS_DELTA = 6
+REF_DELTA = 7
+
+
+class PackFile:
+    """ memory-mapped pack file with its index (version 2). The inflated size and the type of an
+        object are read from the pack entry header (and the header of the delta data), while the
+        disksize is the distance to the next entry in the pack (as %(objectsize:disk) does). """
+    def __init__(self, idxfile: str, hashsize: int = 20) -> None:
+        import mmap  # pylint: disable=import-outside-toplevel
+        self.idxfile = idxfile
+        self.packfile = idxfile[:-len(".idx")] + ".pack"
+        self.hashsize = hashsize
+        with open(idxfile, "rb") as f:
+            self.idx = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(self.packfile, "rb") as f:
+            self.pack = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.idx[0:8] != b"\377tOc\0\0\0\2":
+            raise ValueError("unsupported pack index: " + idxfile)
+        if self.pack[0:4] != b"PACK":
+            raise ValueError("not a pack file: " + self.packfile)
+        self.fanout = struct.unpack(">256I", self.idx[8:8 + 1024])
+        self.count = self.fanout[255]
+        self.shas = 8 + 1024
+        self.offs = self.shas + (hashsize + 4) * self.count
+        self.large = self.offs + 4 * self.count
+        self.ends: Optional["array[int]"] = None  # the sorted offsets - only for the packs being asked
+        self.types: Dict[int, str] = {}
+    def close(self) -> None:
+        self.idx.close()
+        self.pack.close()
+    def find(self, sha: bytes) -> int:
+        first = sha[0]
+        lo: int = self.fanout[first - 1] if first else 0
+        hi: int = self.fanout[first]
+        hashsize, shas, idx = self.hashsize, self.shas, self.idx
+        while lo < hi:
+            mid = (lo + hi) // 2
+            at = shas + mid * hashsize
+            found = idx[at:at + hashsize]
+            if found == sha:
+                return mid
+            if found < sha:
+                lo = mid + 1
+            else:
+                hi = mid
+        return -1
+    def offset(self, pos: int) -> int:
+        at = self.offs + 4 * pos
+        off: int = struct.unpack(">I", self.idx[at:at + 4])[0]
+        if off & 0x80000000:
+            at = self.large + 8 * (off & 0x7FFFFFFF)
+            off = struct.unpack(">Q", self.idx[at:at + 8])[0]
+        return off
+    def offsets(self) -> "array[int]":
+        """ the offsets of all entries in index order (the table is read in one go) """
+        table = array("I", self.idx[self.offs:self.offs + 4 * self.count])
+        if sys.byteorder == "little":
+            table.byteswap()
+        offs = array("Q", table)
+        if len(self.idx) > self.large + 2 * self.hashsize:  # packs over 2 GB have a large offset table
+            for pos, off in enumerate(table):
+                if off & 0x80000000:
+                    offs[pos] = self.offset(pos)
+        return offs
+    def revindex(self) -> Optional["array[int]"]:
+        """ the index positions in pack order from the .rev file (pack.writeReverseIndex) """
+        revfile = self.packfile[:-len(".pack")] + ".rev"
+        if not fs.exists(revfile):
+            return None
+        with open(revfile, "rb") as f:
+            data = f.read(12 + 4 * self.count)
+        if data[0:8] != b"RIDX\0\0\0\1" or len(data) != 12 + 4 * self.count:
+            logg.debug("unsupported reverse index: %s", revfile)
+            return None
+        positions = array("I", data[12:])
+        if sys.byteorder == "little":
+            positions.byteswap()
+        return positions
+    def endof(self, offset: int) -> int:
+        if self.ends is None:
+            offs = self.offsets()
+            positions = self.revindex()
+            if positions is not None:
+                self.ends = array("Q", [offs[pos] for pos in positions])
+            else:
+                self.ends = array("Q", sorted(offs))
+            self.ends.append(len(self.pack) - self.hashsize)
+        end: int = self.ends[bisect.bisect_right(self.ends, offset)]
+        return end
+    def header(self, offset: int) -> Tuple[int, int, int]:
+        """ (type, size, start of data) """
+        pack = self.pack
+        c = pack[offset]
+        typ = (c >> 4) & 7
+        size = c & 15
+        shift = 4
+        pos = offset + 1
+        while c & 0x80:
+            c = pack[pos]
+            pos += 1
+            size |= (c & 0x7F) << shift
+            shift += 7
+        return typ, size, pos
+    def typeof(self, offset: int) -> str:
+        if offset in self.types:
+            return self.types[offset]
+        typ, size, pos = self.header(offset)
+        if typ == OFS_DELTA:
+            result = self.typeof(self.baseof(offset, pos)[0])
+        elif typ == REF_DELTA:
+            basepos = self.find(self.pack[pos:pos + self.hashsize])
+            if basepos < 0:
+                raise KeyError("delta base outside of " + self.packfile)
+            result = self.typeof(self.offset(basepos))
+        else:
+            result = PACKTYPES[typ]
+        self.types[offset] = result
+        return result
+    def baseof(self, offset: int, pos: int) -> Tuple[int, int]:
+        """ the base offset of an ofs-delta and the start of its delta data """
+        pack = self.pack
+        c = pack[pos]
+        pos += 1
+        ofs = c & 0x7F
+        while c & 0x80:
+            c = pack[pos]
+            pos += 1
+            ofs = ((ofs + 1) << 7) | (c & 0x7F)
+        return offset - ofs, pos
+    def deltasize(self, pos: int) -> int:
+        """ the object size is the second varint in the inflated delta data """
+        chunk = 64
+        while True:
+            inflate = zlib.decompressobj()
+            data = inflate.decompress(self.pack[pos:pos + chunk], 32)
+            values: List[int] = []
+            value, shift = 0, 0
+            for c in data:
+                value |= (c & 0x7F) << shift
+                shift += 7
+                if not c & 0x80:
+                    values.append(value)
+                    value, shift = 0, 0
+                    if len(values) == 2:
+                        return values[1]
+            if pos + chunk >= len(self.pack):
+                raise ValueError("broken delta in " + self.packfile)
+            chunk *= 4
+    def get(self, sha: bytes) -> Optional[Tuple[str, int, int]]:
+        """ (type, disksize, filesize) """
+        found = self.find(sha)
+        if found < 0:
+            return None
+        offset = self.offset(found)
+        typ, size, pos = self.header(offset)
+        if typ == OFS_DELTA:
+            size = self.deltasize(self.baseof(offset, pos)[1])
+        elif typ == REF_DELTA:
+            size = self.deltasize(pos + self.hashsize)
+        return self.typeof(offset), self.endof(offset) - offset, size
+
+
+class PackReader:
+    """ object sizes from all the pack files of a repository (without spawning git) """
+    def __init__(self, objects: str, hashsize: int = 20) -> None:
+        self.objects = objects
+        self.hashsize = hashsize
+        self.packs: List[PackFile] = []
+        packdir = fs.join(objects, "pack")
+        if fs.isdir(packdir):
+            for name in sorted(os.listdir(packdir)):
+                if name.endswith(".idx") and fs.exists(fs.join(packdir, name[:-len(".idx")] + ".pack")):
+                    self.packs.append(PackFile(fs.join(packdir, name), hashsize))
+    def get(self, rev: str, name: str = "") -> Optional[HistSize5]:
+        if len(rev) != 2 * self.hashsize:
+            return None
+        sha = bytes.fromhex(rev)
+        for pack in self.packs:
+            try:
+                found = pack.get(sha)
+            except KeyError as e:
+                logg.debug("can not read %s: %s", rev, e)
+                continue  # another pack may have it whole, or else git resolves it
+            if found is not None:
+                typ, disk, size = found
+                return HistSize5(rev, typ, disk, size, name)
+        return None
+    def close(self) -> None:
+        for pack in self.packs:
+            pack.close()
+        self.packs = []
 
 
 def get_nosizes(exts: Optional[str] = None) -> str:
     return "\n".join(" ".join([str_(elem) for elem in item]) for item in each_nosize5(exts=exts))
 
 
-def each_nosize5(exts: Optional[str] = None) -> Iterator[HistSize5]:
+def each_nosize5(exts: Optional[str] = None, top: int = 0, sort: str = "") -> Iterator[HistSize5]:
+    if top:
+        yield from each_top(each_nosize5(exts), top, sort)
+        return
     extlist = exts.split(",") if exts is not None else EXT.split(",")
-    for rev, typ, disk, size, name in each_size5():
+    for rev, typ, disk, size, name in each_size5(BLOBS):
         if typ in ["tree"]:
             continue
         nam, ext = map_splitext(name)
@@ -439,15 +1567,50 @@ def get_oversize() -> str:
     return "\n".join(" ".join([str_(elem) for elem in item]) for item in each_oversize5())
 
 
-def each_oversize5() -> Iterator[HistSize5]:
-    for rev, typ, disk, size, name in each_size5():
+def each_oversize5(top: int = 0, sort: str = "") -> Iterator[HistSize5]:
+    if top:
+        yield from each_top(each_oversize5(), top, sort)
+        return
+    for rev, typ, disk, size, name in each_size5(OVERSIZE):
         if size >= MAXSIZE * MB:
             yield HistSize5(rev, typ, disk, size, name)
 
 
+def get_storeoversize() -> str:
+    return "\n".join(" ".join([str_(elem) for elem in item]) for item in each_storeoversize5())
+
+
+def each_storeoversize5() -> Iterator[HistSize5]:
+    """ the blobs anywhere in the object store (in pack order) with sizes over the lfs limit. Only
+        those get a path name from a second pass over the refs (unreachable blobs have none). """
+    git = GIT
+    found: Dict[str, HistSize5] = OrderedDict()
+    batchcheck = "%(objectsize:disk) %(objectsize) %(objecttype) %(objectname)"
+    for line in each_lines(F"{git} cat-file --batch-all-objects --batch-check='{batchcheck}' --unordered", REPO):
+        parts = line.split(" ", 3)
+        if len(parts) < 4:
+            logg.warning("can not split4: %s", line)
+            continue
+        disk1, size1, type1, rev = parts
+        if type1 in ["blob"] and int(size1) >= MAXSIZE * MB:
+            found[rev] = HistSize5(rev, type1, int(disk1), int(size1), "")
+    logg.info("found %s blobs over %s MB in the object store", len(found), MAXSIZE)
+    names = get_pathnames(found.keys()) if found else {}
+    for rev, item in found.items():
+        yield item._replace(name=names.get(rev, ""))
+
+
+def get_pathnames(revs: Iterable[str], refs: str = "--all") -> Dict[str, str]:
+    """ the first path name for the given objects in the history of the refs. The
+        traversal stops as soon as all objects have been named. """
+    git = GIT
+    objects = split2(each_lines(F"{git} rev-list {refs} --objects", REPO))
+    return dict(each_wanted2(objects, set(revs)))
+
+
 def each_gitfile() -> Iterator[str]:
     found = []
-    for elem in each_size5():
+    for elem in each_size5(BLOBS):
         if "/.git/" in elem.name:
             if elem.name not in found:
                 found.append(elem.name)
@@ -456,7 +1619,7 @@ def each_gitfile() -> Iterator[str]:
 
 def each_gitdir() -> Iterator[str]:
     found = []
-    for elem in each_size5():
+    for elem in each_size5(BLOBS):
         if "/.git/" in elem.name:
             gitpath = re.sub("/[.]git/.*", "/.git", elem.name)
             if gitpath not in found:
@@ -484,14 +1647,10 @@ def get_nosumsizes(exts: Optional[str] = None) -> str:
     return "\n".join(" ".join([str_(elem) for elem in item]) for item in sumsizes)
 
 
-def each_nosumsize4(exts: Optional[str] = None) -> Iterator[SumSize4]:
-    extlist = exts.split(",") if exts is not None else EXT.split(",")
-    for sums, disk, changes, name, parts in each_sumsize5():
-        nam, ext = map_splitext(name)
-        for pat in extlist:
-            if fnmatch(ext, pat):
-                yield SumSize4(sums, disk, changes, name)
-                break
+def each_nosumsize4(exts: Optional[str] = None, top: int = 0, sort: str = "") -> Iterator[SumSize4]:
+    report = NoSumSizeReport(exts)
+    scan_reports([report])
+    yield from each_top(report.each(), top, sort)
 
 
 def get_sumsizes() -> str:
@@ -499,62 +1658,100 @@ def get_sumsizes() -> str:
     return "\n".join(" ".join([str_(elem) for elem in item]) for item in sumsizes)
 
 
-def each_sumsize4() -> Iterator[SumSize4]:
-    for disk, sums, changes, name, parts in each_sumsize5():
-        logg.debug("sum disk %s size %s", disk, sums)
-        yield SumSize4(disk, sums, changes, name)
+def each_sumsize4(top: int = 0, sort: str = "") -> Iterator[SumSize4]:
+    report = SumSizeReport()
+    scan_reports([report])
+    yield from each_top(report.each(), top, sort)
+
+
+def each_sumsize5(top: int = 0, sort: str = "") -> Iterator[SumSize5]:
+    report = SumSizeReport()
+    scan_reports([report])
+    yield from each_top(report.each5(), top, sort)
+
+
+def each_sumoversize4(top: int = 0, sort: str = "") -> Iterator[SumSize4]:
+    report = SumOversizeReport()
+    scan_reports([report])
+    yield from each_top(report.each(), top, sort)
+
 
+def each_sumoversize5(top: int = 0, sort: str = "") -> Iterator[SumSize5]:
+    report = SumOversizeReport()
+    scan_reports([report])
+    yield from each_top(report.each5(), top, sort)
 
-def each_sumsize5() -> Iterator[SumSize5]:
-    disksums: Dict[str, int] = {}
-    filesums: Dict[str, int] = {}
-    dchanges: Dict[str, List[int]] = {}
-    for rev, typ, disk, size, name in each_size5():
-        logg.debug("disk %s size %s", disk, size)
+
+class PathSize3(NamedTuple):
+    name: str
+    disksize: int
+    filesize: int
+
+
+def each_pathsize3() -> Iterator[PathSize3]:
+    """ the file objects in history (newest first) - with INCREMENTAL only new commits are scanned
+        (the stored scan is of the BRANCH, so with REFS all of their history is scanned) """
+    if INCREMENTAL and REFS:
+        logg.warning("incremental is for the branch only - scanning all of %s", " ".join(REFS))
+    if INCREMENTAL and not REFS:
+        for name, changes in get_incremental().items():
+            for disk, size in changes:
+                yield PathSize3(name, disk, size)
+        return
+    for rev, typ, disk, size, name in each_size5(BLOBS):
         if not name:
             continue
         if typ in ["tree"]:
             continue
-        if name not in filesums:
-            disksums[name] = 0
-            filesums[name] = 0
-            dchanges[name] = []
-        filesums[name] += size
-        disksums[name] += disk
-        dchanges[name] += [disk]
-    for name, disksum in disksums.items():
-        yield SumSize5(disksum, filesums[name], len(dchanges[name]), name,
-                       "|" + "+".join([str(item) for item in dchanges[name]]))
-
-
-def each_sumoversize4() -> Iterator[SumSize4]:
-    for disk, sums, changes, name, parts in each_sumoversize5():
-        logg.debug("sum disk %s size %s (over %i MB)", disk, sums, MAXSIZE)
-        yield SumSize4(disk, sums, changes, name)
-
-
-def each_sumoversize5() -> Iterator[SumSize5]:
-    disksums: Dict[str, int] = {}
-    filesums: Dict[str, int] = {}
-    dchanges: Dict[str, List[int]] = {}
-    for rev, typ, disk, size, name in each_size5():
-        if size < MAXSIZE * MB:
-            continue
-        logg.debug("disk %s size %s (over %i MB)", disk, size, MAXSIZE)
+        yield PathSize3(name, disk, size)
+
+
+def get_incremental() -> Dict[str, List[Tuple[int, int]]]:
+    """ update the stored scan of the branch with the commits after the last scanned tip. The
+        paths and their (disksize, filesize) changes are the base for the sum and ext reports.
+        When the old tip is not an ancestor anymore (force-push) then history is scanned again. """
+    git, main = GIT, BRANCH
+    statefile = fs.join(get_gitdir(), "show-bigfiles.%s.json" % re.sub(r"[^\w.-]", "_", main))
+    tip = output(F"{git} rev-parse --verify {main}", REPO).strip()
+    oldtip = ""
+    paths: Dict[str, List[Tuple[int, int]]] = OrderedDict()
+    if fs.exists(statefile):
+        with open(statefile) as f:
+            state = json.load(f)
+        oldtip = state.get("tip", "")
+        for name, changes in state.get("paths", []):
+            paths[name] = [(disk, size) for disk, size in changes]
+    if oldtip == tip:
+        logg.info("incremental %s: no new commits since %s", main, tip)
+        return paths
+    revs = tip
+    if oldtip:
+        out, rc = output2(F"{git} merge-base --is-ancestor {oldtip} {tip}", REPO)
+        if rc:
+            logg.warning("incremental %s: old tip %s is not an ancestor of %s (scanning all)", main, oldtip, tip)
+            paths = OrderedDict()
+        else:
+            revs = F"{tip} ^{oldtip}"
+    newpaths: Dict[str, List[Tuple[int, int]]] = OrderedDict()
+    for rev, typ, disk, size, name in each_revsize5(revs, BLOBS):
         if not name:
             continue
         if typ in ["tree"]:
             continue
-        if name not in filesums:
-            disksums[name] = 0
-            filesums[name] = 0
-            dchanges[name] = []
-        filesums[name] += size
-        disksums[name] += disk
-        dchanges[name] += [disk]
-    for name, disksum in disksums.items():
-        yield SumSize5(disksum, filesums[name], len(dchanges[name]), name,
-                       "|" + "+".join([str(item) for item in dchanges[name]]))
+        if name not in newpaths:
+            newpaths[name] = []
+        newpaths[name].append((disk, size))
+    logg.info("incremental %s: %s new paths changed in %s", main, len(newpaths), revs)
+    for name, changes in paths.items():
+        if name in newpaths:
+            newpaths[name] += changes
+        else:
+            newpaths[name] = changes
+    tmpfile = statefile + ".tmp"
+    with open(tmpfile, "w") as f:
+        json.dump({"branch": main, "tip": tip, "paths": list(newpaths.items())}, f)
+    os.replace(tmpfile, statefile)
+    return newpaths
 
 
 class ExtSize5(NamedTuple):
@@ -570,61 +1767,28 @@ def get_extsizes() -> str:
     return "\n".join(" ".join([str_(elem) for elem in list(item)]) for item in sumsizes)
 
 
-def each_extsize4() -> Iterator[ExtSize5]:
-    for sums, disk, changes, ext, names in each_extsize5():
-        yield ExtSize5(sums, disk, changes, ext, "%s/files" % names.count("|"))
+def each_extsize4(top: int = 0, sort: str = "") -> Iterator[ExtSize5]:
+    report = ExtSizeReport()
+    scan_reports([report])
+    yield from each_top(report.each(), top, sort)
 
 
-def each_extsize5() -> Iterator[ExtSize5]:
-    disksums: Dict[str, int] = {}
-    filesums: Dict[str, int] = {}
-    dchanges: Dict[str, Dict[str, List[int]]] = {}
-    for disksum, filesum, changes, name, diskchanges in each_sumsize5():
-        if not name:
-            continue
-        logg.debug("sum disk %s size %s", disksum, filesum)
-        filename = fs.basename(name)
-        nam, ext = map_splitext(filename)
-        if ext not in filesums:
-            disksums[ext] = 0
-            filesums[ext] = 0
-            dchanges[ext] = {}
-        if name not in dchanges[ext]:
-            dchanges[ext][name] = []
-        filesums[ext] += filesum
-        disksums[ext] += disksum
-        dchanges[ext][name] += [disksum]
-    for ext, disksum in disksums.items():
-        yield ExtSize5(disksum, filesums[ext], len(dchanges[ext]), ext, "|" + "|".join(dchanges[ext]))
-
-
-def each_extoversize4() -> Iterator[ExtSize5]:
-    for sums, disk, changes, ext, names in each_extoversize5():
-        yield ExtSize5(sums, disk, changes, ext, "%s/files" % names.count("|"))
-
-
-def each_extoversize5() -> Iterator[ExtSize5]:
-    disksums: Dict[str, int] = {}
-    filesums: Dict[str, int] = {}
-    dchanges: Dict[str, Dict[str, List[int]]] = {}
-    for disksum, filesum, changes, name, diskchanges in each_sumoversize5():
-        if not name:
-            continue
-        logg.debug("sum disk %s size %s (over %i MB)",
-                   disksum, filesum, MAXSIZE)
-        filename = fs.basename(name)
-        nam, ext = map_splitext(filename)
-        if ext not in filesums:
-            disksums[ext] = 0
-            filesums[ext] = 0
-            dchanges[ext] = {}
-        if name not in dchanges[ext]:
-            dchanges[ext][name] = []
-        filesums[ext] += filesum
-        disksums[ext] += disksum
-        dchanges[ext][name] += [disksum]
-    for ext, disksum in disksums.items():
-        yield ExtSize5(disksum, filesums[ext], len(dchanges[ext]), ext, "|" + "|".join(dchanges[ext]))
+def each_extsize5(top: int = 0, sort: str = "") -> Iterator[ExtSize5]:
+    report = ExtSizeReport()
+    scan_reports([report])
+    yield from each_top(report.each5(), top, sort)
+
+
+def each_extoversize4(top: int = 0, sort: str = "") -> Iterator[ExtSize5]:
+    report = ExtOversizeReport()
+    scan_reports([report])
+    yield from each_top(report.each(), top, sort)
+
+
+def each_extoversize5(top: int = 0, sort: str = "") -> Iterator[ExtSize5]:
+    report = ExtOversizeReport()
+    scan_reports([report])
+    yield from each_top(report.each5(), top, sort)
 
 
 MAPPINGS = """
@@ -649,17 +1813,62 @@ exe.datasync = */DataSync_debug
 """
 
 
-def map_ext(name: str, ext: str) -> str:
-    if not ext:
-        for line in MAPPINGS.splitlines():
+MAPFILES: List[str] = []
+MAPCACHE = 100000
+
+
+class ExtMapper:
+    """ the mapping lines compiled once - the '*/name' lines go into a dict of basenames
+        and the other globs are combined into one regex. The first matching line wins and
+        the results are memoized per path name in a bounded cache. """
+    def __init__(self, mappings: str) -> None:
+        self.mapped: List[str] = []
+        self.exact: Dict[str, int] = {}
+        globs: List[str] = []
+        for line in mappings.splitlines():
             if "=" in line:
                 mapped1, pattern1 = line.split("=", 1)
                 mapped, pattern = mapped1.strip(), pattern1.strip()
-                if fnmatch(name, pattern):
-                    return mapped
-                if pattern.startswith("*/") and "/" not in name:
-                    if fnmatch(name, pattern[2:]):
-                        return mapped
+                index = len(self.mapped)
+                self.mapped.append(mapped)
+                if pattern.startswith("*/") and not re.search(r"[*?\[/]", pattern[2:]):
+                    self.exact.setdefault(pattern[2:], index)
+                elif pattern.startswith("*/"):  # also matching a name without a directory
+                    globs.append(F"(?P<m{index}>{translate(pattern)}|(?=[^/]*\\Z){translate(pattern[2:])})")
+                else:
+                    globs.append(F"(?P<m{index}>{translate(pattern)})")
+        self.globs = re.compile("|".join(globs)) if globs else None
+        self.get = functools.lru_cache(maxsize=MAPCACHE)(self.find)
+    def find(self, name: str) -> str:
+        """ the mapped ext of the first matching line (or empty) """
+        found = self.exact.get(name.rsplit("/", 1)[-1], len(self.mapped))
+        if self.globs is not None:
+            matched = self.globs.match(name)
+            if matched and matched.lastgroup:
+                found = min(found, int(matched.lastgroup[1:]))
+        return self.mapped[found] if found < len(self.mapped) else ""
+
+
+EXTMAPPERS: Dict[str, ExtMapper] = {}
+
+
+def get_extmapper() -> ExtMapper:
+    mappings = MAPPINGS
+    if mappings not in EXTMAPPERS:
+        EXTMAPPERS.clear()
+        EXTMAPPERS[mappings] = ExtMapper(mappings)
+    return EXTMAPPERS[mappings]
+
+
+def load_mappings(filename: str) -> str:
+    """ a project mappings file has the same 'mapped = pattern' lines as MAPPINGS """
+    with open(filename) as f:
+        return f.read()
+
+
+def map_ext(name: str, ext: str) -> str:
+    if not ext:
+        return get_extmapper().get(name)
     return ext
 
 
@@ -679,16 +1888,947 @@ def get_noexts() -> str:
 
 
 def each_noext1() -> Iterator[NoExt1]:
-    noext = []
-    for disksum, filesum, changes, ext, names in each_extsize5():
-        logg.debug("ext '%s'", ext)
-        if fnmatch(ext, EXT):
-            noext = names.split("|")
-            logg.debug("found %s noext", len(noext))
-    for name in noext:
-        if name:
-            logg.debug("name %s", name)
-            yield NoExt1(name)
+    report = NoExtReport()
+    scan_reports([report])
+    yield from report.each()
+
+# ..............................................................
+
+
+class DeltaSize8(NamedTuple):
+    disksum: int
+    filesum: int
+    changes: int
+    fulls: int
+    depth: int
+    partial: int
+    ratio: float
+    name: str
+
+
+class ExtDelta9(NamedTuple):
+    disksum: int
+    filesum: int
+    changes: int
+    fulls: int
+    depth: int
+    partial: int
+    ratio: float
+    ext: str
+    files: str
+
+
+FULLRATIO = 0.9  # disk/file ratio of a version that is neither compressed nor deltified
+FULLSIZE = 64 * KB  # the least disksize per version of a full copy (small files do not compress)
+
+
+def each_deltasize8(top: int = 0, sort: str = "") -> Iterator[DeltaSize8]:
+    report = DeltaReport()
+    scan_reports([report])
+    yield from each_top(report.each(), top, sort)
+
+
+def each_extdelta9(top: int = 0, sort: str = "") -> Iterator[ExtDelta9]:
+    report = ExtDeltaReport()
+    scan_reports([report])
+    yield from each_top(report.each(), top, sort)
+
+
+def each_fullcopies8(top: int = 0, sort: str = "") -> Iterator[DeltaSize8]:
+    report = FullCopiesReport()
+    scan_reports([report])
+    yield from each_top(report.each(), top, sort)
+
+# ..............................................................
+
+
+class Growth7(NamedTuple):
+    period: str
+    ext: str
+    blobs: int
+    disksize: int
+    filesize: int
+    disktotal: int
+    filetotal: int
+
+
+PERIODS = {"day": "%Y-%m-%d", "week": "%G-W%V", "month": "%Y-%m", "year": "%Y"}
+GROWTHTOTAL = "*"  # the ext of the row with the totals of a period
+
+
+def each_newblob3(revs: str, seen: Set[str], pretty: str = "%ct") -> Iterator[Tuple[str, str, str]]:
+    """ the (rev, name, commit) of each blob when it is first seen in 'git log --raw' (oldest first)
+        where the commit is shown by the pretty format """
+    git = GIT
+    merges = "--diff-merges=first-parent" if get_git_version() >= (2, 31) else "-m"
+    cmd = F"{git} log --raw -z --no-abbrev --no-renames --reverse {merges} '--format=%x01{pretty}' {revs}"
+    commit, meta = "", ""
+    for part in each_lines(cmd, REPO, sep=b"\0"):
+        if not meta:  # a header, a raw meta field or an empty field
+            field = part[1:] if part.startswith("\n") else part  # the newline after a header
+            if field.startswith("\x01"):
+                commit = field[1:]
+            elif field.startswith(":"):
+                meta = field
+            continue
+        modes = meta.split()  # the path field follows its meta field (whatever it starts with)
+        meta = ""
+        if len(modes) < 5 or modes[1] in ["000000", "160000"]:
+            continue
+        rev = modes[3]
+        if rev in seen:
+            continue
+        seen.add(rev)
+        yield rev, part, commit
+
+
+def get_growth() -> Dict[str, Dict[str, List[int]]]:
+    """ the [blobs, disksize, filesize] of the new blobs per period and ext - a blob is counted
+        in the period of the first commit that has it. With INCREMENTAL the sums and the seen
+        blobs are stored in $GIT_DIR and only the commits after the last tip are scanned. """
+    git, main, period = GIT, BRANCH, PERIOD
+    timeformat = PERIODS[period]
+    statefile = fs.join(get_gitdir(), "show-bigfiles.growth.%s.json" % re.sub(r"[^\w.-]", "_", main))
+    tip = output(F"{git} rev-parse --verify {main}", REPO).strip() if INCREMENTAL else main
+    growth: Dict[str, Dict[str, List[int]]] = {}
+    seen: Set[str] = set()
+    revs = tip
+    if INCREMENTAL and fs.exists(statefile):
+        with open(statefile) as f:
+            state = json.load(f)
+        oldtip = state.get("tip", "")
+        if state.get("period") != period:
+            logg.info("growth %s: stored by %s (scanning all)", main, state.get("period"))
+        elif oldtip == tip:
+            logg.info("growth %s: no new commits since %s", main, tip)
+            return cast(Dict[str, Dict[str, List[int]]], state["growth"])
+        elif output2(F"{git} merge-base --is-ancestor {oldtip} {tip}", REPO)[1]:
+            logg.warning("growth %s: old tip %s is not an ancestor of %s (scanning all)", main, oldtip, tip)
+        else:
+            growth, seen = state["growth"], set(state["seen"])
+            revs = F"{tip} ^{oldtip}"
+    pending: Dict[str, Tuple[str, str]] = {}
+    def each_object2() -> Iterator[Tuple[str, str]]:
+        for rev, name, commitdate in each_newblob3(revs, seen):
+            nam, ext = map_splitext(fs.basename(name))
+            pending[rev] = (time.strftime(timeformat, time.gmtime(int(commitdate))), ext)
+            yield rev, name
+    for rev, typ, disk, size, name in each_timed(each_objsize5(each_object2()), "objects", "growth"):
+        when, ext = pending.pop(rev)
+        exts = growth.setdefault(when, {})
+        sums = exts.setdefault(ext, [0, 0, 0])
+        sums[0] += 1
+        sums[1] += disk
+        sums[2] += size
+    if INCREMENTAL:
+        tmpfile = statefile + ".tmp"
+        with open(tmpfile, "w") as f:
+            json.dump({"branch": main, "tip": tip, "period": period, "growth": growth, "seen": list(seen)}, f)
+        os.replace(tmpfile, statefile)
+    return growth
+
+
+def each_growth7() -> Iterator[Growth7]:
+    """ the growth of each period per ext and in total (ext '*') with the cumulated sizes """
+    growth = get_growth()
+    totals: Dict[str, List[int]] = {}
+    for when in sorted(growth):
+        exts = growth[when]
+        periodsums = [0, 0, 0]
+        for ext in sorted(exts):
+            blobs, disk, size = exts[ext]
+            total = totals.setdefault(ext, [0, 0])
+            total[0] += disk
+            total[1] += size
+            yield Growth7(when, ext, blobs, disk, size, total[0], total[1])
+            periodsums = [periodsums[0] + blobs, periodsums[1] + disk, periodsums[2] + size]
+        total = totals.setdefault(GROWTHTOTAL, [0, 0])
+        total[0] += periodsums[1]
+        total[1] += periodsums[2]
+        yield Growth7(when, GROWTHTOTAL, periodsums[0], periodsums[1], periodsums[2], total[0], total[1])
+
+
+class CommitSize7(NamedTuple):
+    disksum: int
+    filesum: int
+    blobs: int
+    rev: str
+    date: str
+    author: str
+    name: str
+
+
+class AuthorSize6(NamedTuple):
+    disksum: int
+    filesum: int
+    blobs: int
+    commits: int
+    author: str
+    name: str
+
+
+def get_commitsizes() -> List[CommitSize7]:
+    """ the sizes of the blobs that each commit has introduced - one 'git log --raw' pass where
+        the new blobs are sized in one cat-file batch (commits without new blobs are left out) """
+    main = BRANCH
+    commits: Dict[str, List[int]] = OrderedDict()
+    headers: Dict[str, str] = {}
+    pending: Dict[str, str] = {}
+    def each_object2() -> Iterator[Tuple[str, str]]:
+        for rev, name, header in each_newblob3(main, set(), "%H;%ct;%ae;%an"):
+            commit = header.split(";", 1)[0]
+            if commit not in headers:
+                headers[commit] = header
+                commits[commit] = [0, 0, 0]
+            pending[rev] = commit
+            yield rev, name
+    for rev, typ, disk, size, name in each_timed(each_objsize5(each_object2()), "objects", "commits"):
+        sums = commits[pending.pop(rev)]
+        sums[0] += disk
+        sums[1] += size
+        sums[2] += 1
+    found: List[CommitSize7] = []
+    for commit, (disk, size, blobs) in commits.items():
+        parts = headers[commit].split(";", 3) + ["", "", ""]
+        when = time.strftime("%Y-%m-%d", time.gmtime(int(parts[1]))) if parts[1] else ""
+        found.append(CommitSize7(disk, size, blobs, commit, when, parts[2], parts[3]))
+    return found
+
+
+def each_commitsize7(top: int = 0, sort: str = "") -> Iterator[CommitSize7]:
+    """ the commits ranked by the blob bytes they introduced (the largest commits last, see TOP) """
+    yield from each_top(get_commitsizes(), top, sort)
+
+
+def each_authorsize6(top: int = 0, sort: str = "") -> Iterator[AuthorSize6]:
+    """ the authors ranked by the blob bytes of their commits (from the same pass as commitsize) """
+    authors: Dict[str, List[int]] = OrderedDict()
+    names: Dict[str, str] = {}
+    for disk, size, blobs, rev, when, author, name in get_commitsizes():
+        if author not in authors:
+            authors[author] = [0, 0, 0, 0]
+        names[author] = name  # the latest one
+        sums = authors[author]
+        sums[0] += disk
+        sums[1] += size
+        sums[2] += blobs
+        sums[3] += 1
+    found = [AuthorSize6(disk, size, blobs, commits, author, names[author])
+             for author, (disk, size, blobs, commits) in authors.items()]
+    yield from each_top(found, top, sort)
+
+# ..............................................................
+
+
+class LfsPlan6(NamedTuple):
+    moved: int
+    lfssize: int
+    remaining: int
+    files: int
+    changes: int
+    plan: str
+
+
+LFSPLANS = 8  # the largest extensions for the default plans
+LFSATTRIBUTES = "filter=lfs diff=lfs merge=lfs -text"
+
+
+def get_lfs_regex(pattern: str) -> str:
+    """ a .gitattributes pattern as a regex - a pattern without a slash is for the basename
+        (see LfsPlanner.match) and '**' matches across directories """
+    regex = ""
+    for part in re.split(r"(\*\*/|/\*\*|\*|\?|\[[^\]]+\])", pattern.lstrip("/")):
+        if part == "**/":
+            regex += "(?:.*/)?"
+        elif part == "/**":
+            regex += "/.*"
+        elif part == "*":
+            regex += "[^/]*"
+        elif part == "?":
+            regex += "[^/]"
+        elif part.startswith("[") and len(part) > 2:
+            regex += "[^" + part[2:] if part.startswith("[!") else part
+        else:
+            regex += re.escape(part)
+    return regex + r"\Z"
+
+
+class LfsPlanner:
+    """ the file paths of history summed up once, for evaluating many lfs plans. A plan is a set of
+        .gitattributes patterns (and 'above=MB' for the files ever larger than that). Each distinct
+        pattern is matched only once against the unique basenames or paths, and a plan is then
+        the union of the matched paths - so a hundred plans cost about as much as one scan. """
+    def __init__(self, items: Iterable[PathSize3] = ()) -> None:
+        self.names: List[str] = []
+        self.disksums = array("q")
+        self.filesums = array("q")
+        self.changes = array("I")
+        self.maxsizes = array("q")
+        self.basenames: Dict[str, List[int]] = {}
+        self.matched: Dict[str, Set[int]] = {}
+        indexes: Dict[str, int] = {}
+        for name, disk, size in items:
+            index = indexes.get(name)
+            if index is None:
+                index = indexes[name] = len(self.names)
+                self.names.append(name)
+                self.disksums.append(0)
+                self.filesums.append(0)
+                self.changes.append(0)
+                self.maxsizes.append(0)
+                self.basenames.setdefault(name.rsplit("/", 1)[-1], []).append(index)
+            self.disksums[index] += disk
+            self.filesums[index] += size
+            self.changes[index] += 1
+            self.maxsizes[index] = max(self.maxsizes[index], size)
+        self.total = sum(self.disksums)
+    def match(self, pattern: str) -> Set[int]:
+        """ the paths of a pattern (memoized) """
+        if pattern not in self.matched:
+            if pattern.startswith("above="):
+                limit = float(pattern[len("above="):]) * MB
+                found = set(index for index, size in enumerate(self.maxsizes) if size >= limit)
+            elif "/" not in pattern.rstrip("/"):
+                matching = re.compile(get_lfs_regex(pattern))
+                found = set(index for basename, paths in self.basenames.items() if matching.match(basename) for index in paths)
+            else:
+                matching = re.compile(get_lfs_regex(pattern))
+                found = set(index for index, name in enumerate(self.names) if matching.match(name))
+            self.matched[pattern] = found
+        return self.matched[pattern]
+    def evaluate(self, plan: str) -> LfsPlan6:
+        found: Set[int] = set()
+        for pattern in plan.replace(",", " ").split():
+            found |= self.match(pattern)
+        moved = sum(self.disksums[index] for index in found)
+        lfssize = sum(self.filesums[index] for index in found)
+        changes = sum(self.changes[index] for index in found)
+        return LfsPlan6(moved, lfssize, self.total - moved, len(found), changes, plan)
+    def candidates(self) -> List[str]:
+        """ the default plans - the largest extensions added one by one, and the files above MAXSIZE """
+        exts: Dict[str, int] = {}
+        for index, name in enumerate(self.names):
+            nam, ext = map_splitext(name.rsplit("/", 1)[-1])
+            if ext.startswith(".") and not re.search(r"[\s*?\[\\]", ext):
+                exts[ext] = exts.get(ext, 0) + self.disksums[index]
+        largest = sorted(exts, key=lambda ext: exts[ext], reverse=True)[:LFSPLANS]
+        plans = [" ".join("*" + ext for ext in largest[:count]) for count in range(1, len(largest) + 1)]
+        above = "above=%s" % MAXSIZE
+        return plans + [above] + [plan + " " + above for plan in plans[:3]]
+    def best(self, plans: List[str], target: Optional[float] = None) -> LfsPlan6:
+        """ the plan with the fewest lfs files that leaves at most the target share of history
+            (LFSTARGET). Without a target, or when no plan reaches it, the plan that moves the
+            most bytes per lfs file - a superset plan only wins when its added files carry
+            about as much weight as the ones before. """
+        target = LFSTARGET if target is None else target
+        evaluated = [self.evaluate(plan) for plan in plans]
+        if target > 0:
+            reaching = [item for item in evaluated if item.remaining <= self.total * target]
+            if reaching:
+                return min(reaching, key=lambda item: (item.files, item.remaining))
+        return max(evaluated, key=lambda item: (item.moved / max(1, item.files), -item.remaining))
+    def gitattributes(self, plan: str) -> str:
+        """ the .gitattributes lines of a plan - the 'above' files are listed by their path """
+        lines = ["# lfs plan: " + plan]
+        covered: Set[int] = set()
+        patterns = plan.replace(",", " ").split()
+        for pattern in patterns:
+            if not pattern.startswith("above="):
+                lines.append(F"{pattern} {LFSATTRIBUTES}")
+                covered |= self.match(pattern)
+        for pattern in patterns:
+            if pattern.startswith("above="):
+                for index in sorted(self.match(pattern) - covered):
+                    name = re.sub(r"([*?\[\\#!])", r"\\\1", self.names[index]).replace(" ", "[[:space:]]")
+                    lines.append(F"/{name} {LFSATTRIBUTES}")
+                    covered.add(index)
+        return "\n".join(lines)
+
+
+def get_lfsplans(args: List[str]) -> List[str]:
+    """ one plan per arg (patterns separated by spaces or commas) - or @file with one plan per line """
+    plans: List[str] = []
+    for arg in args:
+        if arg.startswith("@"):
+            with open(arg[1:]) as f:
+                plans += get_lfsplans([line.strip() for line in f if line.strip() and not line.startswith("#")])
+            continue
+        plans.append(" ".join(arg.replace(",", " ").split()))
+    return plans
+
+
+def each_lfsplan6(plans: List[str] = []) -> Iterator[LfsPlan6]:
+    planner = LfsPlanner(each_pathsize3())
+    for plan in plans or planner.candidates():
+        yield planner.evaluate(plan)
+
+
+def get_lfsattributes(plans: List[str] = []) -> str:
+    planner = LfsPlanner(each_pathsize3())
+    return planner.gitattributes(planner.best(plans or planner.candidates()).plan)
+
+# ..............................................................
+
+
+class SizeReport:
+    """ The reports are accumulators that are fed from one scan of the history, so
+        that several commands can be shown while paying for only one traversal. """
+    headers: List[str] = ["disksize", "filesize", "rev", "typ"]
+    filtered = ""  # what the scan may leave out (BLOBS or OVERSIZE)
+    def __init__(self) -> None:
+        self.items = Inventory()
+    def add(self, item: HistSize5) -> None:
+        self.items.add(item)
+    def each(self) -> Iterator[Any]:
+        return iter(self.items)
+
+
+class OversizeReport(SizeReport):
+    filtered = OVERSIZE
+    def add(self, item: HistSize5) -> None:
+        if item.filesize >= MAXSIZE * MB:
+            self.items.add(item)
+
+
+class NoSizeReport(SizeReport):
+    filtered = BLOBS
+    def __init__(self, exts: Optional[str] = None) -> None:
+        SizeReport.__init__(self)
+        self.extlist = exts.split(",") if exts is not None else EXT.split(",")
+    def add(self, item: HistSize5) -> None:
+        if item.typ in ["tree"]:
+            return
+        nam, ext = map_splitext(item.name)
+        for pat in self.extlist:
+            if fnmatch(ext, pat):
+                self.items.add(item)
+                break
+
+
+class GitDirReport(SizeReport):
+    headers: List[str] = []
+    filtered = BLOBS
+    def __init__(self) -> None:
+        SizeReport.__init__(self)
+        self.found: Dict[str, None] = OrderedDict()
+    def add(self, item: HistSize5) -> None:
+        if "/.git/" in item.name:
+            gitpath = re.sub("/[.]git/.*", "/.git", item.name)
+            self.found[gitpath] = None
+    def each(self) -> Iterator[Any]:
+        return iter(self.found)
+
+
+class SumSizeReport(SizeReport):
+    """ the file objects summarized per path - can be fed from the stored scan of INCREMENTAL """
+    headers: List[str] = ["disksum", "filesum", "changes"]
+    filtered = BLOBS
+    oversize = False
+    def __init__(self) -> None:
+        SizeReport.__init__(self)
+        self.disksums: Dict[str, int] = {}
+        self.filesums: Dict[str, int] = {}
+        self.dchanges: Dict[str, List[int]] = {}
+    def add(self, item: HistSize5) -> None:
+        if not item.name:
+            return
+        if item.typ in ["tree"]:
+            return
+        self.addpath(item.name, item.disksize, item.filesize)
+    def addpath(self, name: str, disk: int, size: int) -> None:
+        if self.oversize and size < MAXSIZE * MB:
+            return
+        if name not in self.filesums:
+            self.disksums[name] = 0
+            self.filesums[name] = 0
+            self.dchanges[name] = []
+        self.filesums[name] += size
+        self.disksums[name] += disk
+        self.dchanges[name] += [disk]
+    def each5(self) -> Iterator[SumSize5]:
+        for name, disksum in self.disksums.items():
+            yield SumSize5(disksum, self.filesums[name], len(self.dchanges[name]), name,
+                           "|" + "+".join([str(item) for item in self.dchanges[name]]))
+    def each(self) -> Iterator[Any]:
+        for disk, sums, changes, name, parts in self.each5():
+            logg.debug("sum disk %s size %s", disk, sums)
+            yield SumSize4(disk, sums, changes, name)
+
+
+class SumOversizeReport(SumSizeReport):
+    filtered = OVERSIZE
+    oversize = True
+
+
+class NoSumSizeReport(SumSizeReport):
+    def __init__(self, exts: Optional[str] = None) -> None:
+        SumSizeReport.__init__(self)
+        self.extlist = exts.split(",") if exts is not None else EXT.split(",")
+    def each(self) -> Iterator[Any]:
+        for disk, sums, changes, name, parts in self.each5():
+            nam, ext = map_splitext(name)
+            for pat in self.extlist:
+                if fnmatch(ext, pat):
+                    yield SumSize4(disk, sums, changes, name)
+                    break
+
+
+class ExtSizeReport(SumSizeReport):
+    headers: List[str] = ["disksum", "filesum", "changes", "ext", "files"]
+    def each5(self) -> Iterator[ExtSize5]:  # type: ignore[override]
+        disksums: Dict[str, int] = {}
+        filesums: Dict[str, int] = {}
+        dchanges: Dict[str, Dict[str, List[int]]] = {}
+        for disksum, filesum, changes, name, diskchanges in SumSizeReport.each5(self):
+            if not name:
+                continue
+            logg.debug("sum disk %s size %s", disksum, filesum)
+            filename = fs.basename(name)
+            nam, ext = map_splitext(filename)
+            if ext not in filesums:
+                disksums[ext] = 0
+                filesums[ext] = 0
+                dchanges[ext] = {}
+            if name not in dchanges[ext]:
+                dchanges[ext][name] = []
+            filesums[ext] += filesum
+            disksums[ext] += disksum
+            dchanges[ext][name] += [disksum]
+        for ext, disksum in disksums.items():
+            yield ExtSize5(disksum, filesums[ext], len(dchanges[ext]), ext, "|" + "|".join(dchanges[ext]))
+    def each(self) -> Iterator[Any]:
+        for sums, disk, changes, ext, names in self.each5():
+            yield ExtSize5(sums, disk, changes, ext, "%s/files" % names.count("|"))
+
+
+class ExtOversizeReport(ExtSizeReport):
+    filtered = OVERSIZE
+    oversize = True
+
+
+class NoExtReport(ExtSizeReport):
+    headers: List[str] = []
+    def each(self) -> Iterator[Any]:
+        noext: List[str] = []
+        for disksum, filesum, changes, ext, names in self.each5():
+            logg.debug("ext '%s'", ext)
+            if fnmatch(ext, EXT):
+                noext = names.split("|")
+                logg.debug("found %s noext", len(noext))
+        for name in noext:
+            if name:
+                logg.debug("name %s", name)
+                yield NoExt1(name)
+
+
+class DeltaReport(SizeReport):
+    """ the file objects summarized per path with the delta chains of the packs - 'fulls' are
+        the versions stored without a delta base, 'depth' is the longest chain and 'ratio' is
+        disksum/filesum. The 'partial' versions have a chain that leaves the scanned objects
+        (their depth is counted up to there). The bases are filled by the scan (see scan_reports). """
+    headers: List[str] = ["disksum", "filesum", "changes", "fulls", "depth", "partial", "ratio", "name"]
+    filtered = BLOBS
+    def __init__(self) -> None:
+        SizeReport.__init__(self)
+        self.bases: Dict[str, str] = {}
+        self.depths: Dict[str, int] = {}
+        self.partials: Set[str] = set()
+        self.scanned: Set[str] = set()
+        self.revs: Dict[str, List[HistSize5]] = {}
+    def add(self, item: HistSize5) -> None:
+        if not item.name:
+            return
+        if item.typ in ["tree"]:
+            return
+        if item.name not in self.revs:
+            self.revs[item.name] = []
+        self.revs[item.name].append(item)
+        self.scanned.add(item.rev)
+    def depth(self, rev: str) -> int:
+        """ the length of the delta chain down to a full object (iterative, memoized) - when the
+            chain leads to an object that was not scanned then its revs are marked as partials """
+        chain: List[str] = []
+        while rev in self.bases and rev not in self.depths:
+            chain.append(rev)
+            rev = self.bases[rev]
+        depth = self.depths.get(rev, 0)
+        partial = rev in self.partials if rev in self.depths else rev not in self.scanned
+        for rev in reversed(chain):
+            depth += 1
+            self.depths[rev] = depth
+            if partial:
+                self.partials.add(rev)
+        return depth
+    def each(self) -> Iterator[Any]:
+        for name, items in self.revs.items():
+            disksum = sum(item.disksize for item in items)
+            filesum = sum(item.filesize for item in items)
+            fulls = len([item for item in items if item.rev not in self.bases])
+            depth = max(self.depth(item.rev) for item in items)
+            partial = len([item for item in items if item.rev in self.partials])
+            ratio = round(disksum / filesum, 3) if filesum else 0.0
+            yield DeltaSize8(disksum, filesum, len(items), fulls, depth, partial, ratio, name)
+
+
+class FullCopiesReport(DeltaReport):
+    """ the paths with several versions where each one is stored as a full copy that does not
+        compress - the candidates for lfs, ranked by their disksum. A file with one version has
+        nothing to deltify against and the small files (below FULLSIZE) are left out. """
+    def each(self) -> Iterator[Any]:
+        for item in DeltaReport.each(self):
+            if item.changes > 1 and item.fulls == item.changes and item.ratio >= FULLRATIO \
+                    and item.disksum >= item.changes * FULLSIZE:
+                yield item
+
+
+class ExtDeltaReport(DeltaReport):
+    headers: List[str] = ["disksum", "filesum", "changes", "fulls", "depth", "partial", "ratio", "ext", "files"]
+    def each(self) -> Iterator[Any]:
+        sums: Dict[str, List[int]] = {}
+        files: Dict[str, int] = {}
+        for disksum, filesum, changes, fulls, depth, partial, ratio, name in DeltaReport.each(self):
+            nam, ext = map_splitext(fs.basename(name))
+            if ext not in sums:
+                sums[ext] = [0, 0, 0, 0, 0, 0]
+                files[ext] = 0
+            extsums = sums[ext]
+            extsums[0] += disksum
+            extsums[1] += filesum
+            extsums[2] += changes
+            extsums[3] += fulls
+            extsums[4] = max(extsums[4], depth)
+            extsums[5] += partial
+            files[ext] += 1
+        for ext, (disksum, filesum, changes, fulls, depth, partial) in sums.items():
+            ratio = round(disksum / filesum, 3) if filesum else 0.0
+            yield ExtDelta9(disksum, filesum, changes, fulls, depth, partial, ratio, ext, "%s/files" % files[ext])
+
+
+REPORTS: Dict[str, Callable[[], SizeReport]] = {
+    "size": SizeReport, "oversize": OversizeReport, "nosize": NoSizeReport,
+    "sumsize": SumSizeReport, "sumoversize": SumOversizeReport, "nosumsize": NoSumSizeReport,
+    "extsize": ExtSizeReport, "extoversize": ExtOversizeReport, "noext": NoExtReport,
+    "git": GitDirReport, "gitlist": GitDirReport,
+    "deltasize": DeltaReport, "extdelta": ExtDeltaReport, "fullcopies": FullCopiesReport,
+}
+
+
+def scan_reports(reports: Sequence[SizeReport]) -> None:
+    """ feed all reports from a single scan (the sum reports may use the INCREMENTAL scan) """
+    if INCREMENTAL and not REFS:
+        sumreports = [report for report in reports if isinstance(report, SumSizeReport)]
+        if sumreports:
+            for name, disk, size in each_timed(each_pathsize3(), "paths", "aggregate"):
+                for sumreport in sumreports:
+                    sumreport.addpath(name, disk, size)
+            reports = [report for report in reports if not isinstance(report, SumSizeReport)]
+    if reports:
+        filters = set(report.filtered for report in reports)
+        filtered = "" if "" in filters else BLOBS if BLOBS in filters else OVERSIZE
+        deltareports = [report for report in reports if isinstance(report, DeltaReport)]
+        if deltareports:  # one dict of delta bases shared by all delta reports
+            deltabases: Dict[str, str] = {}
+            for deltareport in deltareports:
+                deltareport.bases = deltabases
+            scanned = each_size5(filtered, deltabases=deltabases)
+        else:
+            scanned = each_size5(filtered)
+        for item in each_timed(scanned, "objects", "aggregate"):
+            for report in reports:
+                report.add(item)
+
+
+def print_reports(cmds: List[str], formats: Dict[str, str]) -> None:
+    reports = [REPORTS[cmd]() for cmd in cmds]
+    scan_reports(reports)
+    for report in reports:
+        print_table(report.each(), report.headers, formats)
+
+
+class FleetRepo7(NamedTuple):
+    repo: str
+    objects: int
+    disksum: int
+    filesum: int
+    oversize: int
+    seconds: float
+    status: str
+
+
+class FleetSize5(NamedTuple):
+    repo: str
+    disksum: int
+    filesum: int
+    changes: int
+    name: str
+
+
+def get_fleet_repos(args: List[str]) -> List[str]:
+    """ repo paths or glob patterns (or @file with one of them per line) """
+    repos: List[str] = []
+    for arg in args:
+        if arg.startswith("@"):
+            with open(arg[1:]) as f:
+                repos += get_fleet_repos([line.strip() for line in f if line.strip() and not line.startswith("#")])
+            continue
+        found = sorted(path for path in glob.glob(arg) if fs.isdir(path))
+        for repo in found or [arg]:
+            if repo not in repos:
+                repos.append(repo)
+    return repos
+
+
+def run_fleetscan() -> None:
+    """ the scan of one repo in fleet mode, printed as json for the fleet command """
+    objects, disksum, filesum, oversize = 0, 0, 0, 0
+    report = SumSizeReport()
+    for item in each_size5():
+        objects += 1
+        disksum += item.disksize
+        filesum += item.filesize
+        if item.filesize >= MAXSIZE * MB:
+            oversize += 1
+        report.add(item)
+    top = list(each_top(report.each(), FLEETTOP, "disksum"))
+    print(json.dumps({"objects": objects, "disksum": disksum, "filesum": filesum, "oversize": oversize,
+                      "top": [list(item) for item in top]}))
+
+
+async def scan_fleet_async(repo: str) -> Tuple[FleetRepo7, List[FleetSize5]]:
+    """ scan one repo in a child process that is killed after the TIMEOUT """
+    options = ["-g", GIT, "-b", BRANCH, "-x", str(MAXSIZE), "-E", EXT, "-j", "1"]
+    options += ["--refs=" + ref for ref in REFS]
+    options += ["--mappings=" + fs.abspath(filename) for filename in MAPFILES]
+    options += (["--cache"] if CACHE else []) + (["--packread"] if PACKREAD else [])
+    options += (["--incremental"] if INCREMENTAL else [])
+    cmd = [sys.executable, fs.abspath(__file__), "-r", repo] + options + ["fleetscan"]
+    started = time.monotonic()
+    if not fs.isdir(repo):
+        logg.error("not a directory: %s", repo)
+        return FleetRepo7(repo, 0, 0, 0, 0, 0.0, "not found"), []
+    try:
+        out, errors, returncode = await output3_async(cmd, shell=False, timeout=TIMEOUT)
+    except subprocess.TimeoutExpired:
+        logg.error("timeout after %ss: %s", TIMEOUT, repo)
+        return FleetRepo7(repo, 0, 0, 0, 0, round(time.monotonic() - started, 3), "timeout"), []
+    seconds = round(time.monotonic() - started, 3)
+    errors = errors.strip()
+    try:
+        data = json.loads(out)
+    except ValueError:
+        status = errors.splitlines()[-1] if errors else "exit %s" % returncode
+        logg.error("failed %s: %s", repo, status)
+        return FleetRepo7(repo, 0, 0, 0, 0, seconds, status), []
+    if errors:
+        logg.debug("%s: %s", repo, errors)
+    top = [FleetSize5(repo, disk, size, changes, name) for disk, size, changes, name in data["top"]]
+    return FleetRepo7(repo, data["objects"], data["disksum"], data["filesum"], data["oversize"], seconds, "ok"), top
+
+
+def get_fleet(repos: List[str]) -> Tuple[List[FleetRepo7], List[FleetSize5]]:
+    """ scan the repos concurrently (JOBS at a time) - returns the totals per repo and the top offenders """
+    results = run_async(gather_async(scan_fleet_async(repo) for repo in repos))
+    totals = [total for total, top in results]
+    offenders = sorted([item for total, top in results for item in top], key=lambda x: x.disksum, reverse=True)
+    return totals, offenders[:FLEETTOP]
+
+# ..............................................................
+
+
+def get_tips() -> Dict[str, str]:
+    """ the refs of a scan (the REFS or else the BRANCH) with their object ids """
+    git = GIT
+    if REFS:
+        pattern = " ".join(["'%s'" % pat for pat in REFS])
+        out = output(F"{git} for-each-ref --format='%(objectname) %(refname)' {pattern}", REPO)
+        return OrderedDict((ref, rev) for rev, ref in splits2(out))
+    rev = output(F"{git} rev-parse --verify -q '{BRANCH}'", REPO).strip()
+    return {BRANCH: rev} if rev else {}
+
+
+def is_ancestor(old: str, new: str) -> bool:
+    git = GIT
+    out, rc = output2(F"{git} merge-base --is-ancestor {old} {new}", REPO)
+    return not rc
+
+
+class WarmRepo:
+    """ the scan of a repo that the serve daemon keeps in memory. A refresh sizes only the
+        objects that the moved ref tips have added, and those are fed to the reports that have
+        been asked for so far. When a ref was rewound or deleted then history is scanned again. """
+    def __init__(self, repo: str) -> None:
+        self.repo = repo
+        self.tips: Dict[str, str] = {}
+        self.items = Inventory()
+        self.known: Set[bytes] = set()  # the binary ids in items (kept along as the rebuild is O(repo))
+        self.reports: Dict[str, SizeReport] = {}
+        self.answers: Dict[Tuple[str, int, str], List[Any]] = {}
+        self.encoded: Dict[Tuple[str, int, str], str] = {}
+        self.scanned = 0.0
+        self.lock = threading.RLock()
+    def refresh(self) -> int:
+        """ update from the current ref tips - returns the number of new objects (-1 if unchanged) """
+        global REPO
+        oldrepo, REPO = REPO, self.repo
+        try:
+            tips = get_tips()
+            if tips == self.tips:
+                return -1
+            started = time.monotonic()
+            rewound = [ref for ref in self.tips if ref not in tips]
+            rewound += [ref for ref, rev in self.tips.items() if rev != tips.get(ref, rev) and not is_ancestor(rev, tips[ref])]
+            if rewound:
+                logg.warning("%s: rewound %s (scanning all)", self.repo, " ".join(rewound))
+            revs = list(tips.values())
+            if self.tips and not rewound:
+                revs += ["^" + rev for rev in self.tips.values()]
+            found = list(each_revssize5([revs])) if tips else []
+        finally:
+            REPO = oldrepo
+        with self.lock:
+            if rewound or not self.tips:
+                self.items = Inventory()
+                self.known = set()
+                self.reports = {}
+            new: List[HistSize5] = []
+            for item in found:
+                rev = bytes.fromhex(item.rev)
+                if rev not in self.known:  # an old blob may come back with a revert
+                    self.known.add(rev)
+                    new.append(item)
+            found = new
+            for item in found:
+                self.items.add(item)
+                for report in self.reports.values():
+                    report.add(item)
+            self.answers = {}
+            self.encoded = {}
+            self.tips = tips
+            self.scanned = time.time()
+        logg.info("%s: %s new objects in %.3fs (%s objects)", self.repo, len(found),
+                  time.monotonic() - started, len(self.items))
+        return len(found)
+    def query(self, name: str, top: int = 0, sort: str = "") -> List[Any]:
+        """ the rows of a report - they are computed once after each refresh """
+        with self.lock:
+            key = (name, top, sort)
+            if key not in self.answers:
+                report = self.reports.get(name)
+                if report is None:
+                    report = self.reports[name] = REPORTS[name]()
+                    for item in self.items:
+                        report.add(item)
+                self.answers[key] = [item._asdict() for item in each_top(report.each(), top, sort)]
+            return self.answers[key]
+    def query_json(self, name: str, top: int = 0, sort: str = "") -> str:
+        """ the rows of a report as json - encoded once after each refresh """
+        with self.lock:
+            key = (name, top, sort)
+            if key not in self.encoded:
+                self.encoded[key] = json.dumps(self.query(name, top, sort))
+            return self.encoded[key]
+
+
+SERVEQUERIES = ["size", "oversize", "sumsize", "sumoversize", "extsize", "extoversize"]
+
+
+def get_served(warm: Dict[str, WarmRepo], request: Dict[str, Any]) -> str:
+    """ the json answer of the serve daemon for a {query, repo, top, sort} request (or an {error}) """
+    query = request.get("query") or "sumsize"
+    if query in ["repos"]:
+        rows = [{"repo": name, "objects": len(repo.items), "refs": len(repo.tips), "scanned": repo.scanned}
+                for name, repo in warm.items()]
+        return json.dumps({"query": query, "rows": rows})
+    if query not in SERVEQUERIES:
+        return json.dumps({"error": "unknown query %s (use %s)" % (query, "|".join(SERVEQUERIES + ["repos"]))})
+    wanted = request.get("repo") or ""
+    found = [repo for name, repo in warm.items() if not wanted or wanted in [name, fs.basename(name.rstrip("/"))]]
+    if len(found) != 1:
+        return json.dumps({"error": "no such repo %s" % wanted if not found else "a repo is needed (%s)" % len(found)})
+    encoded = found[0].query_json(query, int(request.get("top") or 0), request.get("sort") or "")
+    answer = {"query": query, "repo": found[0].repo, "objects": len(found[0].items), "scanned": found[0].scanned,
+              "headers": getattr(REPORTS[query], "headers", [])}
+    return json.dumps(answer)[:-1] + ', "rows": ' + encoded + "}"  # the rows are encoded already
+
+
+def serve_repos(repos: List[str]) -> None:
+    """ scan the repos and keep them warm in memory - the queries are answered on the unix SOCKET
+        by json lines (and on localhost:PORT by http get) while the refs are checked every REFRESH """
+    # pylint: disable=import-outside-toplevel
+    import socketserver
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    from urllib.parse import urlsplit, parse_qs
+    warm: Dict[str, WarmRepo] = OrderedDict((repo, WarmRepo(repo)) for repo in repos)
+    for repo in warm.values():
+        repo.refresh()
+
+    class LineHandler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            for line in self.rfile:
+                try:
+                    answer = get_served(warm, json.loads(line))
+                except (ValueError, AttributeError) as e:
+                    answer = json.dumps({"error": "bad request: %s" % e})
+                self.wfile.write(answer.encode("utf-8") + b"\n")
+
+    class HttpHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # pylint: disable=invalid-name
+            url = urlsplit(self.path)
+            request = dict((key, values[0]) for key, values in parse_qs(url.query).items())
+            status = 200
+            try:
+                answer = get_served(warm, dict(request, query=url.path.strip("/")))
+                if answer.startswith('{"error"'):
+                    status = 404
+            except ValueError as e:
+                answer, status = json.dumps({"error": "bad request: %s" % e}), 400
+            data = answer.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+            logg.debug("http: " + format, *args)
+
+    servers: List[socketserver.BaseServer] = []
+    if fs.exists(SOCKET):
+        os.remove(SOCKET)
+    servers.append(socketserver.ThreadingUnixStreamServer(SOCKET, LineHandler))
+    if PORT:
+        servers.append(ThreadingHTTPServer(("127.0.0.1", PORT), HttpHandler))
+    for server in servers:
+        threading.Thread(target=server.serve_forever, name="serve", daemon=True).start()
+    logg.warning("serving %s repos on %s%s", len(warm), SOCKET, " and http://127.0.0.1:%s" % PORT if PORT else "")
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    try:
+        while not stopping.wait(REFRESH):
+            for repo in warm.values():
+                try:
+                    repo.refresh()
+                except (OSError, ValueError) as e:
+                    logg.error("%s: refresh failed: %s", repo.repo, e)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        if fs.exists(SOCKET):
+            os.remove(SOCKET)
+
+
+def query_server(query: str, repo: str = "", top: int = 0, sort: str = "") -> Dict[str, Any]:
+    """ ask the serve daemon on the SOCKET """
+    import socket  # pylint: disable=import-outside-toplevel
+    request = {"query": query, "repo": repo, "top": top, "sort": sort}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(SOCKET)
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile("rb") as answer:
+            return cast(Dict[str, Any], json.loads(answer.readline()))
 
 
 def get_help() -> str:
@@ -700,74 +2840,138 @@ def get_help() -> str:
     return text + __doc__
 
 
-def _main(cmd: str, args: List[str]) -> None:
-    data: JSONList
+STREAMFORMATS = ["csv", "scsv", "list", "tab", "tabs", "dat", "ifs", "data", "jsonl"]
+
+
+def print_table(data: Iterable[Any], sorts: Sequence[str] = [], formats: Dict[str, str] = {}) -> None:
+    """ print a table sorted by tabToFMT - or with STREAM written row by row as it is found. With
+        TOP only the largest rows are kept while the data is consumed. """
+    data = each_timed(each_top(data, TOP, SORT), "scan", "render", "rows")
+    if STREAM and FMT in STREAMFORMATS:
+        tabToStream(FMT, data, sorts, formats)
+    else:
+        rows = list(data)
+        started = time.monotonic()
+        print(tabToFMT(FMT, rows, sorts, formats))
+        if STATS:
+            add_stats("render", seconds=time.monotonic() - started)
+
+
+def _main(cmd: str, args: List[str]) -> int:
     if PRETTY:
-        formats = {"disksum": " {:_}", "filesum": " {:_}", "changes": " "}
+        formats = {"disksum": " {:_}", "filesum": " {:_}", "changes": " ", "fulls": " ", "depth": " ",
+                   "partial": " ", "ratio": " "}
     else:
-        formats = {"disksum": " ", "filesum": " ", "changes": " "}
+        formats = {"disksum": " ", "filesum": " ", "changes": " ", "fulls": " ", "depth": " ",
+                   "partial": " ", "ratio": " "}
     name = cmd.replace("-", "_")
-    if F"run_{name}" in globals():
+    if args and cmd in REPORTS and not [arg for arg in args if arg not in REPORTS]:
+        print_reports([cmd] + args, formats)  # several reports from one scan
+    elif F"run_{name}" in globals():
         methodcall = globals()[F"run_{name}"]
         methodcall()
     elif cmd in ["help"]:  # this help screen
         print(get_help())
     elif cmd in ["oversize"]:  # show files in all revs with sizes over lfs limit
         headers = ["disksize", "filesize", "rev", "typ"]
-        data = list(each_oversize5())  # type: ignore[arg-type]
-        print(tabToFMT(FMT, data, headers, formats))  # type: ignore[arg-type]
+        print_table(each_oversize5(), headers, formats)
         # print(get_oversize())
+    elif cmd in ["prereceive", "pre-receive"]:  # check a push for files over lfs limit (hook stdin, nonzero exit)
+        report, exitcode = get_prereceive(sys.stdin)
+        if report:
+            print(report)
+        return exitcode
+    elif cmd in ["serve"]:  # keep repos scanned in memory and answer queries on --socket/--port
+        serve_repos(get_fleet_repos(args) if args else [REPO or "."])
+    elif cmd in ["query"]:  # ask the serve daemon for a report (query sumsize [repo])
+        answer = query_server(args[0] if args else "sumsize", args[1] if len(args) > 1 else "", TOP, SORT)
+        if "error" in answer:
+            logg.error("%s", answer["error"])
+            return 1
+        print_table(answer["rows"], answer.get("headers", []), formats)
+    elif cmd in ["staged", "precommit", "pre-commit"]:  # check the index for files over lfs limit or -E ext (pre-commit hook)
+        report, exitcode = get_staged()
+        if report:
+            print(report)
+        return exitcode
+    elif cmd in ["storeoversize"]:  # show blobs anywhere in the object store with sizes over lfs limit
+        headers = ["disksize", "filesize", "rev", "typ"]
+        print_table(each_storeoversize5(), headers, formats)
     elif cmd in ["size"]:  # show sizes of all revs
         headers = ["disksize", "filesize", "rev", "typ"]
-        data = list(each_size5())  # type: ignore[arg-type]
-        print(tabToFMT(FMT, data, headers, formats))  # type: ignore[arg-type]
+        print_table(each_size5(), headers, formats)
         # print(get_sizes())
     # show sizes of all revs with -E '' (default no extension)
     elif cmd in ["nosize"]:
         headers = ["disksize", "filesize", "rev", "typ"]
-        data = list(each_nosize5())  # type: ignore[arg-type]
-        print(tabToFMT(FMT, data, headers, formats))  # type: ignore[arg-type]
+        print_table(each_nosize5(), headers, formats)
         # print(get_nosizes())
     elif cmd in ["nosumsize"]:  # show sizes of all revs with -E '' summarized per file history
         headers = ["disksum", "filesum", "changes"]
-        data = list(each_nosumsize4())  # type: ignore[arg-type]
-        print(tabToFMT(FMT, data, headers, formats))  # type: ignore[arg-type]
+        print_table(each_nosumsize4(), headers, formats)
         # print(get_nosumsizes())
     elif cmd in ["sumsize"]:  # show sizes of all revs summarized per file history
         headers = ["disksum", "filesum", "changes"]
-        data = list(each_sumsize4())  # type: ignore[arg-type]
-        print(tabToFMT(FMT, data, headers, formats))  # type: ignore[arg-type]
+        print_table(each_sumsize4(), headers, formats)
         # print(get_sumsizes())
     # show sizes of all revs with oversize files summarized per file history
     elif cmd in ["sumoversize"]:
         headers = ["disksum", "filesum", "changes"]
-        data = list(each_sumoversize4())  # type: ignore[arg-type]
-        print(tabToFMT(FMT, data, headers, formats))  # type: ignore[arg-type]
+        print_table(each_sumoversize4(), headers, formats)
         # print(get_sumsizes())
     elif cmd in ["extoversize"]:  # show ext with oversize files and summarize over history
         headers = ["disksum", "filesum", "changes", "ext", "files"]
-        data = list(each_extoversize4())  # type: ignore[arg-type]
-        print(tabToFMT(FMT, data, headers, formats))  # type: ignore[arg-type]
+        print_table(each_extoversize4(), headers, formats)
         # print(get_extoversizes())
     elif cmd in ["extsize"]:  # show sizes of all revs summarized per file extension and history
         headers = ["disksum", "filesum", "changes", "ext", "files"]
-        data = list(each_extsize4())  # type: ignore[arg-type]
-        print(tabToFMT(FMT, data, headers, formats))  # type: ignore[arg-type]
+        print_table(each_extsize4(), headers, formats)
         # print(get_extsizes())
+    elif cmd in ["deltasize"]:  # show delta chains and compression ratio summarized per file history
+        headers = ["disksum", "filesum", "changes", "fulls", "depth", "partial", "ratio", "name"]
+        print_table(each_deltasize8(), headers, formats)
+    elif cmd in ["extdelta"]:  # show delta chains and compression ratio summarized per file extension
+        headers = ["disksum", "filesum", "changes", "fulls", "depth", "partial", "ratio", "ext", "files"]
+        print_table(each_extdelta9(), headers, formats)
+    elif cmd in ["fullcopies"]:  # show files stored as uncompressed full copies in every rev (lfs first)
+        headers = ["disksum", "filesum", "changes", "fulls", "depth", "partial", "ratio", "name"]
+        print_table(each_fullcopies8(), headers, formats)
+    elif cmd in ["growth"]:  # show new blob sizes per --period and ext with cumulated totals (-I keeps a checkpoint)
+        sizes = formats["disksum"]
+        growthformats = dict(formats, blobs=" ", disksize=sizes, filesize=sizes, disktotal=sizes, filetotal=sizes)
+        headers = ["period", "ext", "blobs", "disksize", "filesize", "disktotal", "filetotal"]
+        print_table(each_growth7(), headers, growthformats)
+    elif cmd in ["commitsize"]:  # show the largest commits by the blob bytes they introduced
+        headers = ["disksum", "filesum", "blobs", "rev", "date", "author", "name"]
+        print_table(each_commitsize7(), headers, dict(formats, blobs=" "))
+    elif cmd in ["authorsize"]:  # show the authors by the blob bytes their commits introduced
+        headers = ["disksum", "filesum", "blobs", "commits", "author", "name"]
+        print_table(each_authorsize6(), headers, dict(formats, blobs=" ", commits=" "))
+    elif cmd in ["lfsplan"]:  # evaluate lfs plans ('*.zip docs/** above=MB' or @file) on one scan
+        sizes = formats["disksum"]
+        planformats = dict(formats, moved=sizes, lfssize=sizes, remaining=sizes, files=" ")
+        print_table(each_lfsplan6(get_lfsplans(args)), ["remaining", "files"], planformats)
+    elif cmd in ["lfsattributes"]:  # show the .gitattributes lines of the best lfs plan
+        print(get_lfsattributes(get_lfsplans(args)))
     elif cmd in ["noext"]:  # show files with no extension as show on 'extsizes'
-        print(tabToFMT(FMT, list(each_noext1())))  # type: ignore[arg-type]
+        print_table(each_noext1())
         # print(get_noexts())
     # show /.git/ paths having files (for migrations)
     elif cmd in ["git", "gitlist"]:
-        print(tabToFMT(FMT, list(each_gitdir())))  # type: ignore[arg-type]
+        print_table(each_gitdir())
         # print(get_noexts())
     # show list of authors and committers (for migrations)
     elif cmd in ["authors", "authorlist"]:
-        print(tabToFMT(FMT, list(each_author4())))  # type: ignore[arg-type]
+        print_table(each_author4())
     # show list of authors and committers (for migrations)
     elif cmd in ["mail", "emails", "emaillist"]:
-        print(tabToFMT(FMT, list(each_mail2())))  # type: ignore[arg-type]
+        print_table(each_mail2())
         # print(get_noexts())
+    elif cmd in ["fleet"]:  # show totals and top files of many repos (paths or globs as args)
+        totals, offenders = get_fleet(get_fleet_repos(args))
+        fleetformats = dict(formats, objects=" ", oversize=" ", seconds=" ")
+        print(tabToFMT(FMT, totals, ["repo"], fleetformats, reorder=list(FleetRepo7._fields)))  # type: ignore[arg-type]
+        print(tabToFMT(FMT, offenders, ["disksum"], fleetformats, reorder=list(FleetSize5._fields)))  # type: ignore[arg-type]
     elif "." in cmd and cmd[0] == "*":
         print(get_nosizes(exts=cmd[1:]))
     elif "." in cmd:
@@ -775,12 +2979,14 @@ def _main(cmd: str, args: List[str]) -> None:
     elif F"get_{name}" in globals():
         methodcall = globals()[F"get_{name}"]
         print(methodcall())
+    return 0
 
 
 def _main_() -> int:
-    global GIT, BRANCH, REPO, MAXSIZE, PRETTY, EXT, FMT
+    global GIT, BRANCH, REPO, MAXSIZE, LFSTARGET, PRETTY, EXT, FMT, CACHE, INCREMENTAL, PACKREAD, REFS, JOBS, TIMEOUT
+    global MAPFILES, MAPPINGS, STREAM, TOP, SORT, STATS, STATSFILE, SOCKET, PORT, REFRESH, PERIOD, SHARDS
     from optparse import OptionParser  # pylint: disable=deprecated-module,import-outside-toplevel
-    cmdline = OptionParser("%prog [options] test*",
+    cmdline = OptionParser("%prog [options] command [command...]",
                            epilog=__doc__.strip().split("\n", 1)[0])
     cmdline.formatter.max_help_position = 28
     cmdline.add_option("-v", "--verbose", action="count", default=0,
@@ -793,18 +2999,58 @@ def _main_() -> int:
                        help="use different git client [%default]")
     cmdline.add_option("-b", "--branch", metavar="NAME", default=BRANCH,
                        help="use different def branch [%default]")
+    cmdline.add_option("--all", action="store_true", default=False,
+                       help="scan all refs instead of the def branch [%default]")
+    cmdline.add_option("--tags", action="store_true", default=False,
+                       help="scan all tags instead of the def branch [%default]")
+    cmdline.add_option("--refs", metavar="GLOB", action="append", default=list(REFS),
+                       help="scan for-each-ref patterns instead of the def branch [%default]")
+    cmdline.add_option("-j", "--jobs", metavar="NUM", default=JOBS,
+                       help="parallel git processes (0 = cpu count) [%default]")
+    cmdline.add_option("--shards", metavar="NUM", default=SHARDS,
+                       help="traverse the history of the branch in up to --jobs ranges (no gain on one cpu) [%default]")
+    cmdline.add_option("-T", "--timeout", metavar="SECS", default=TIMEOUT,
+                       help="stop the scan of a repo in fleet mode [%default]")
     cmdline.add_option("-r", "--repo", metavar="PATH", default=REPO,
                        help="use different repo path [%default]")
     cmdline.add_option("-l", "--logfile", metavar="FILE", default="",
                        help="additionally save the output log to a file [%default]")
     cmdline.add_option("-x", "--maxsize", metavar="MB", default=MAXSIZE,
                        help="oversize files (in MB) must be in lfs [%default]")
+    cmdline.add_option("--lfstarget", metavar="RATIO", default=LFSTARGET,
+                       help="lfsattributes picks the smallest plan leaving this share of history (0 = densest) [%default]")
     cmdline.add_option("-P", "--pretty", action="store_true", default=False,
                        help="enhanced value results [%default]")
     cmdline.add_option("-E", "--ext", metavar="EXT", default=EXT,
                        help="show nolist for this ext [%default]")
+    cmdline.add_option("-M", "--mappings", metavar="FILE", action="append", default=list(MAPFILES),
+                       help="use project ext mappings before the builtin ones [%default]")
     cmdline.add_option("-o", "--fmt", metavar="md|text|csv", default=FMT,
                        help="use differen tabtotext [%default]")
+    cmdline.add_option("--stream", action="store_true", default=STREAM,
+                       help="write csv/tab/dat/jsonl rows unsorted as they are found [%default]")
+    cmdline.add_option("-N", "--top", metavar="NUM", default=TOP,
+                       help="show only the largest rows of a report (0 = all) [%default]")
+    cmdline.add_option("--sort", metavar="|".join(TOPSORTS), default=SORT,
+                       help="the column for the top rows (default %s) [%%default]" % TOPSORTS[0])
+    cmdline.add_option("--stats", action="store_true", default=STATS,
+                       help="write the time/bytes/memory of each phase as json to stderr [%default]")
+    cmdline.add_option("--statsfile", metavar="FILE", default=STATSFILE,
+                       help="write the --stats json to a file [%default]")
+    cmdline.add_option("--socket", metavar="PATH", default=SOCKET,
+                       help="the unix socket of serve and query [%default]")
+    cmdline.add_option("--port", metavar="NUM", default=PORT,
+                       help="serve http on localhost too (0 = off) [%default]")
+    cmdline.add_option("--refresh", metavar="SECS", default=REFRESH,
+                       help="check the refs for new commits in serve mode [%default]")
+    cmdline.add_option("--period", metavar="|".join(PERIODS), default=PERIOD, type="choice", choices=list(PERIODS),
+                       help="the time buckets of the growth report [%default]")
+    cmdline.add_option("-C", "--cache", action="store_true", default=CACHE,
+                       help="keep the sizes of packed objects in $GIT_DIR/%s (not the loose ones) [%%default]" % CACHEFILE)
+    cmdline.add_option("-I", "--incremental", action="store_true", default=INCREMENTAL,
+                       help="keep the history scan in $GIT_DIR for sum/ext reports [%default]")
+    cmdline.add_option("-K", "--packread", action="store_true", default=PACKREAD,
+                       help="read object sizes from the pack files directly [%default]")
     opt, cmdline_args = cmdline.parse_args()
     logging.basicConfig(level=logging.WARNING -
                         opt.verbose * 5 + opt.quiet * 10)
@@ -816,11 +3062,32 @@ def _main_() -> int:
         return 0
     GIT = opt.git
     BRANCH = opt.branch
+    REFS = opt.refs + (["refs/tags"] if opt.tags else []) + (["refs"] if opt.all else [])
+    if opt.incremental and REFS:
+        cmdline.error("--incremental keeps the scan of the --branch only (not with --all/--tags/--refs)")
+    JOBS = int(opt.jobs)
+    SHARDS = int(opt.shards)
+    TIMEOUT = float(opt.timeout)
     REPO = opt.repo or None
     MAXSIZE = float(opt.maxsize)
+    LFSTARGET = float(opt.lfstarget)
     PRETTY = opt.pretty
     EXT = opt.ext
+    MAPFILES = opt.mappings
+    MAPPINGS = "".join(load_mappings(filename) + "\n" for filename in MAPFILES) + MAPPINGS
     FMT = opt.fmt
+    STREAM = opt.stream
+    TOP = int(opt.top)
+    SORT = opt.sort
+    STATS = opt.stats or bool(opt.statsfile)
+    STATSFILE = opt.statsfile
+    CACHE = opt.cache
+    INCREMENTAL = opt.incremental
+    PACKREAD = opt.packread
+    SOCKET = opt.socket
+    PORT = int(opt.port)
+    REFRESH = float(opt.refresh)
+    PERIOD = opt.period
     logg.debug("BRANCH %s REPO %s", BRANCH, REPO)
     #
     _logfile = None  # pylint: disable=invalid-name
@@ -835,7 +3102,10 @@ def _main_() -> int:
     #
     logg.debug("args %s", cmdline_args)
     if cmdline_args:
-        _main(cmdline_args[0], cmdline_args[1:])
+        exitcode = _main(cmdline_args[0], cmdline_args[1:])
+        if STATS:
+            write_stats()
+        return exitcode
     else:
         print(get_help())
     return 0
@@ -0,0 +1,528 @@
+#! /usr/bin/env python3
+""" benchmarks for bigfile detection on generated repos """
+
+__copyright__ = "(C) Guido Draheim, all rights reserved"""
+__version__ = "1.1.3077"
+
+# pylint: disable=missing-function-docstring,missing-class-docstring,unspecified-encoding,dangerous-default-value,unused-argument,unused-variable,line-too-long,multiple-statements,consider-using-f-string
+# pylint: disable=global-statement,invalid-name
+from typing import Union, Optional, List, Dict, Any, NamedTuple
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import subprocess
+import tracemalloc
+import unittest
+from fnmatch import fnmatchcase as fnmatch
+import shutil
+import logging
+#
+sys.path.append(os.curdir)
+from src import git_show_bigfiles as app  # pylint: disable=wrong-import-position,import-error # nopep8
+
+logg = logging.getLogger("BENCHING")
+
+stringtypes = str  # pylint: disable=invalid-name
+
+GIT = "git"
+BRANCH = "main"
+KEEP = False
+KB = 1024
+MB = KB * KB
+SCRIPT = "src/git_show_bigfiles.py"
+SCALE = 1.0  # multiply the commits of each benchmark repo
+RESULTS = "tmp/bench.json"
+BASELINE = ""
+TOLERANCE = 1.5  # slower than the baseline by this factor is a regression
+SLACK = 0.1  # seconds - do not count regressions of very short runs
+BENCHCMDS = ["size", "oversize", "nosize", "sumsize", "sumoversize", "nosumsize",
+             "extsize", "extoversize", "noext", "gitlist", "storeoversize", "sumsize extsize oversize"]
+
+RESULTDATA: Dict[str, Any] = {}
+BASELINEDATA: Dict[str, Any] = {}
+
+
+def decodes(text: Union[bytes, str]) -> str:
+    if isinstance(text, bytes):
+        encoded = sys.getdefaultencoding()
+        if encoded in ["ascii"]:
+            encoded = "utf-8"
+        try:
+            return text.decode(encoded)
+        except UnicodeDecodeError:
+            return text.decode("latin-1")
+    return text  # also for None
+
+
+def sh____(cmd: Union[str, List[str]], cwd: Optional[str] = None, shell: bool = True) -> int:
+    if isinstance(cmd, stringtypes):
+        logg.info(": %s", cmd)
+    else:
+        logg.info(": %s", " ".join(["'%s'" % item for item in cmd]))
+    return subprocess.check_call(cmd, cwd=cwd, shell=shell)
+
+
+def output(cmd: Union[str, List[str]], cwd: Optional[str] = None, shell: bool = True, pipe: Optional[bytes] = None) -> str:
+    if isinstance(cmd, stringtypes):
+        logg.info(": %s", cmd)
+    else:
+        logg.info(": %s", " ".join(["'%s'" % item for item in cmd]))
+    run = subprocess.Popen(cmd, cwd=cwd, shell=shell, stdout=subprocess.PIPE,
+                           stdin=subprocess.PIPE if pipe is not None else None)
+    out, err = run.communicate(pipe)
+    return decodes(out)
+
+
+def gentext(rnd: random.Random, size: int) -> bytes:
+    """ a text with words and lines that compresses like source code """
+    words = ["".join(rnd.choice("bcdfghjklmnpqrstvwxz") + rnd.choice("aeiouy") for syl in range(rnd.randint(1, 4)))
+             for word in range(200)]
+    text: List[str] = []
+    length = 0
+    while length < size:
+        line = " ".join(rnd.choice(words) for word in range(rnd.randint(1, 12)))
+        text.append(line)
+        length += len(line) + 1
+    return ("\n".join(text) + "\n").encode("utf-8")[:size]
+
+
+class BenchRepo(NamedTuple):
+    commits: int = 20
+    files: int = 10  # text files changed in the commits
+    bigfiles: int = 0  # binaries added along the history
+    bigsize: int = 1 * MB
+    depth: int = 1  # of the directory tree
+    branches: int = 0  # each with one extra commit
+
+
+def mk_benchrepo(repo: str, params: BenchRepo, seed: int = 1234567891) -> int:
+    """ generate a repo by git fast-import and return the number of objects in it """
+    git, main = GIT, BRANCH
+    rnd = random.Random(seed)
+    sh____(F"{git} init -q -b {main} {repo}")
+    logg.info(": %s", F"{git} fast-import --quiet")
+    run = subprocess.Popen(F"{git} fast-import --quiet", cwd=repo, shell=True, stdin=subprocess.PIPE)
+    assert run.stdin is not None
+    stream = run.stdin  # written as generated so that this process stays small
+
+    def filename(num: int, ext: str) -> str:
+        dirs = [F"d{(num + level) % 3}" for level in range(params.depth - 1)]
+        return "/".join(dirs + [F"f{num}{ext}"])
+
+    def modify(path: str, data: bytes) -> None:
+        stream.write(b"M 100644 inline %s\ndata %i\n" % (path.encode("utf-8"), len(data)))
+        stream.write(data + b"\n")
+
+    def commit(ref: str, mark: int, parent: int, message: str) -> None:
+        msg = message.encode("utf-8")
+        stream.write(b"commit %s\nmark :%i\n" % (ref.encode("utf-8"), mark))
+        stream.write(b"committer Bench <bench@example.com> %i +0000\n" % (1700000000 + mark * 60))
+        stream.write(b"data %i\n%s\n" % (len(msg), msg))
+        if parent:
+            stream.write(b"from :%i\n" % parent)
+    commits = max(1, int(params.commits * SCALE))
+    every = max(1, commits // params.bigfiles) if params.bigfiles else 0
+    bignum = 0
+    for num in range(commits):
+        commit(F"refs/heads/{main}", num + 1, num, F"change {num}")
+        changes = params.files if not num else max(1, params.files // 4)
+        for change in range(changes):
+            filenum = change if not num else rnd.randrange(params.files)
+            modify(filename(filenum, ".txt"), gentext(rnd, rnd.randint(1 * KB, 8 * KB)))
+        if every and num % every == every - 1 and bignum < params.bigfiles:
+            modify(filename(bignum, ".bin"), rnd.randbytes(params.bigsize))
+            bignum += 1
+    for branch in range(params.branches):
+        mark = commits + branch + 1
+        commit(F"refs/heads/branch{branch}", mark, 1 + rnd.randrange(commits), F"branch {branch}")
+        modify(filename(params.files + branch, ".txt"), gentext(rnd, 4 * KB))
+    stream.close()
+    if run.wait():
+        raise subprocess.CalledProcessError(run.returncode, "fast-import")
+    sh____(F"{git} checkout -q {main}", repo)
+    return len(output(F"{git} rev-list --all --objects", repo).splitlines())
+
+
+def get_peak_rss(pid: int) -> int:
+    """ the high water mark of a running process in KB (zero where /proc is not available) """
+    try:
+        with open(F"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def run_command(repo: str, cmd: str, options: List[str] = [], stdin: Optional[str] = None) -> Dict[str, Any]:
+    """ time one CLI run. The peak RSS is polled from /proc as the rusage of a child would also
+        include the memory of this process (forked before exec). Git children are not included. """
+    args = [sys.executable, SCRIPT, "-r", repo, "-b", BRANCH, "-g", GIT] + options + cmd.split()
+    logg.info(": %s", " ".join(args))
+    started = time.monotonic()
+    run = subprocess.Popen(args, stdout=subprocess.DEVNULL, stdin=subprocess.PIPE if stdin is not None else None)
+    if run.stdin is not None:
+        run.stdin.write((stdin or "").encode("utf-8"))
+        run.stdin.close()
+    peak = 0
+    while True:
+        pid, status, usage = os.wait4(run.pid, os.WNOHANG)
+        if pid:
+            break
+        peak = max(peak, get_peak_rss(run.pid))
+        time.sleep(0.002)
+    seconds = time.monotonic() - started
+    run.returncode = os.waitstatus_to_exitcode(status)
+    if run.returncode:
+        logg.error("returncode %s: %s", run.returncode, cmd)
+    return {"seconds": round(seconds, 4), "maxrss_kb": peak or usage.ru_maxrss, "returncode": run.returncode}
+
+
+class GitBigfileBenchTest(unittest.TestCase):
+    def rm_testdir(self, testname: str) -> str:
+        newdir = "tmp/tmp." + testname
+        if os.path.isdir(newdir):
+            shutil.rmtree(newdir)
+        return newdir
+
+    def bench(self, name: str, params: BenchRepo, options: List[str] = []) -> None:
+        """ time all BENCHCMDS on a generated repo and compare them with the BASELINE """
+        testdir = self.rm_testdir(name)
+        repo = F"{testdir}/repo"
+        started = time.monotonic()
+        objects = mk_benchrepo(repo, params)
+        logg.info("%s: generated %s objects in %.2fs", name, objects, time.monotonic() - started)
+        commands: Dict[str, Dict[str, Any]] = {}
+        for cmd in BENCHCMDS:
+            result = run_command(repo, cmd, options)
+            result["objects_per_second"] = round(objects / max(result["seconds"], 0.0001), 1)
+            commands[cmd] = result
+            logg.info("%s: %-24s %8.3fs %10.1f obj/s %8i KB", name, cmd,
+                      result["seconds"], result["objects_per_second"], result["maxrss_kb"])
+        commands.update(self.bench_api(repo))
+        RESULTDATA["benchmarks"][name] = {"repo": dict(params._asdict(), objects=objects, scale=SCALE),
+                                          "options": options, "commands": commands}
+        regressions = self.regressions(name, commands)
+        for cmd, result in commands.items():
+            self.assertEqual(result.get("returncode", 0), 0, cmd)
+        self.assertEqual(regressions, [])
+        if not KEEP:
+            self.rm_testdir(name)
+
+    def regressions(self, name: str, commands: Dict[str, Dict[str, Any]]) -> List[str]:
+        regressions = []
+        baseline = BASELINEDATA.get("benchmarks", {}).get(name, {}).get("commands", {})
+        for cmd, result in commands.items():
+            if cmd in baseline:
+                limit = baseline[cmd]["seconds"] * TOLERANCE + SLACK
+                if result["seconds"] > limit:
+                    logg.error("%s: %s took %.3fs (baseline %.3fs)", name, cmd, result["seconds"], baseline[cmd]["seconds"])
+                    regressions.append(cmd)
+        return regressions
+
+    def bench_api(self, repo: str) -> Dict[str, Dict[str, Any]]:
+        """ time each_size5() and tabToFMT() in this process (peak memory by tracemalloc) """
+        results: Dict[str, Dict[str, Any]] = {}
+        app.REPO = repo
+        app.BRANCH = BRANCH
+        app.GIT = GIT
+        tracemalloc.start()
+        started = time.monotonic()
+        data = list(app.each_size5())
+        seconds = time.monotonic() - started
+        current, peak = tracemalloc.get_traced_memory()
+        results["api:each_size5"] = {"seconds": round(seconds, 4), "peak_kb": peak // KB,
+                                     "objects_per_second": round(len(data) / max(seconds, 0.0001), 1)}
+        tracemalloc.reset_peak()
+        started = time.monotonic()
+        text = app.tabToFMT("md", data, ["disksize", "filesize"], {"disksize": " ", "filesize": " "})  # type: ignore[arg-type]
+        seconds = time.monotonic() - started
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results["api:tabToFMT"] = {"seconds": round(seconds, 4), "peak_kb": peak // KB,
+                                   "objects_per_second": round(len(data) / max(seconds, 0.0001), 1)}
+        return results
+
+    def test_801_small(self) -> None:
+        self.bench("test_801", BenchRepo(commits=50, files=20))
+
+    def test_802_history(self) -> None:
+        self.bench("test_802", BenchRepo(commits=400, files=100))
+
+    def test_803_binaries(self) -> None:
+        self.bench("test_803", BenchRepo(commits=100, files=20, bigfiles=20, bigsize=2 * MB))
+
+    def test_804_nested(self) -> None:
+        self.bench("test_804", BenchRepo(commits=200, files=200, depth=8))
+
+    def test_805_branches(self) -> None:
+        self.bench("test_805", BenchRepo(commits=200, files=50, bigfiles=5, branches=20), ["--all"])
+
+    def test_811_prereceive(self) -> None:
+        """ the latency of the hook for a typical push onto a large history """
+        name = "test_811"
+        git, main = GIT, BRANCH
+        testdir = self.rm_testdir(name)
+        repo = F"{testdir}/repo"
+        params = BenchRepo(commits=1000, files=300, bigfiles=10, depth=4, branches=10)
+        objects = mk_benchrepo(repo, params)
+        rnd = random.Random(987654321)
+        env = dict(os.environ, GIT_AUTHOR_NAME="Bench", GIT_AUTHOR_EMAIL="bench@example.com",
+                   GIT_COMMITTER_NAME="Bench", GIT_COMMITTER_EMAIL="bench@example.com")
+        old = output(F"{git} rev-parse {main}", repo).strip()
+        pushes: Dict[str, str] = {}
+        parent = old
+        for num in range(5):  # a push of five commits, the last one with a binary
+            for change in range(3):
+                with open(F"{repo}/push{num}_{change}.txt", "wb") as f:
+                    f.write(gentext(rnd, 4 * KB))
+            if num == 4:
+                with open(F"{repo}/push.bin", "wb") as f:
+                    f.write(rnd.randbytes(2 * MB))
+            sh____(F"{git} add .", repo)
+            tree = output(F"{git} write-tree", repo).strip()
+            parent = decodes(subprocess.check_output(F"{git} commit-tree {tree} -p {parent} -m 'push {num}'",
+                                                     cwd=repo, shell=True, env=env)).strip()
+            if num == 3:
+                pushes["prereceive"] = F"{old} {parent} refs/heads/{main}\n"
+        pushes["prereceive oversize"] = F"{old} {parent} refs/heads/{main}\n"
+        pushes["prereceive newbranch"] = F"{'0' * 40} {parent} refs/heads/topic\n"
+        commands: Dict[str, Dict[str, Any]] = {}
+        for cmd, stdin in pushes.items():
+            runs = [run_command(repo, "prereceive", ["-x", "1"], stdin) for attempt in range(5)]
+            result = sorted(runs, key=lambda run: run["seconds"])[len(runs) // 2]  # median
+            result["objects_per_second"] = round(objects / max(result["seconds"], 0.0001), 1)
+            commands[cmd] = result
+            logg.info("%s: %-24s %8.3fs %8i KB (exit %s)", name, cmd,
+                      result["seconds"], result["maxrss_kb"], result["returncode"])
+        RESULTDATA["benchmarks"][name] = {"repo": dict(params._asdict(), objects=objects, scale=SCALE),
+                                          "options": ["-x", "1"], "commands": commands}
+        self.assertEqual(commands["prereceive"]["returncode"], 0)
+        self.assertEqual(commands["prereceive oversize"]["returncode"], 1)
+        self.assertEqual(commands["prereceive newbranch"]["returncode"], 1)
+        self.assertEqual(self.regressions(name, commands), [])
+        if not KEEP:
+            self.rm_testdir(name)
+
+    def test_812_serve(self) -> None:
+        """ the latency of the queries to a warm serve daemon against a full scan """
+        name = "test_812"
+        testdir = self.rm_testdir(name)
+        repo = F"{testdir}/repo"
+        params = BenchRepo(commits=1000, files=300, bigfiles=10, depth=4, branches=1)
+        objects = mk_benchrepo(repo, params)
+        commands: Dict[str, Dict[str, Any]] = {}
+        commands["sumsize"] = run_command(repo, "sumsize", ["-x", "1"])
+        socketfile = os.path.abspath(F"{testdir}/serve.sock")
+        args = [sys.executable, SCRIPT, "-r", repo, "-b", BRANCH, "-g", GIT, "-x", "1", "--socket", socketfile, "serve"]
+        started = time.monotonic()
+        daemon = subprocess.Popen(args)
+        try:
+            while not os.path.exists(socketfile):
+                self.assertIsNone(daemon.poll())
+                time.sleep(0.01)
+            commands["serve"] = {"seconds": round(time.monotonic() - started, 4), "maxrss_kb": get_peak_rss(daemon.pid)}
+            app.SOCKET = socketfile
+            for cmd in ["sumsize", "extsize", "oversize", "size"]:
+                seconds = []
+                for attempt in range(11):  # the first query computes the report
+                    started = time.monotonic()
+                    answer = app.query_server(cmd)
+                    seconds.append(time.monotonic() - started)
+                    self.assertNotIn("error", answer)
+                commands[F"query {cmd} first"] = {"seconds": round(seconds[0], 4)}
+                commands[F"query {cmd}"] = {"seconds": round(sorted(seconds[1:])[len(seconds) // 2], 4)}
+        finally:
+            daemon.terminate()
+            daemon.wait()
+            app.SOCKET = "show-bigfiles.sock"
+        for cmd, result in commands.items():
+            logg.info("%s: %-24s %8.4fs", name, cmd, result["seconds"])
+        RESULTDATA["benchmarks"][name] = {"repo": dict(params._asdict(), objects=objects, scale=SCALE),
+                                          "options": ["-x", "1"], "commands": commands}
+        self.assertLess(commands["query sumsize"]["seconds"], commands["sumsize"]["seconds"])
+        self.assertEqual(self.regressions(name, commands), [])
+        if not KEEP:
+            self.rm_testdir(name)
+
+    def test_813_sizer(self) -> None:
+        """ sizing small sets of objects many times - a cat-file per call against a GitObjectSizer """
+        name = "test_813"
+        testdir = self.rm_testdir(name)
+        repo = F"{testdir}/repo"
+        params = BenchRepo(commits=100, files=100, bigfiles=0, depth=2, branches=1)
+        objects = mk_benchrepo(repo, params)
+        app.REPO = repo
+        app.BRANCH = BRANCH
+        app.GIT = GIT
+        blobs = [(item.rev, item.name) for item in app.each_size5(app.BLOBS)]
+        rnd = random.Random(123)
+        queries = [rnd.sample(blobs, 5) for num in range(500)]
+        commands: Dict[str, Dict[str, Any]] = {}
+        started = time.monotonic()
+        for query in queries:
+            self.assertEqual(len(list(app.each_objsize5(query))), 5)
+        commands["api:each_objsize5"] = {"seconds": round(time.monotonic() - started, 4)}
+        started = time.monotonic()
+        with app.GitObjectSizer(repo) as sizer:
+            for query in queries:
+                self.assertEqual(len(list(app.each_objsize5(query))), 5)
+        commands["api:GitObjectSizer"] = {"seconds": round(time.monotonic() - started, 4), "hits": sizer.hits}
+        for cmd, result in commands.items():
+            logg.info("%s: %-24s %8.4fs", name, cmd, result["seconds"])
+        RESULTDATA["benchmarks"][name] = {"repo": dict(params._asdict(), objects=objects, scale=SCALE),
+                                          "options": [], "commands": commands}
+        self.assertLess(commands["api:GitObjectSizer"]["seconds"], commands["api:each_objsize5"]["seconds"])
+        self.assertEqual(self.regressions(name, commands), [])
+        if not KEEP:
+            self.rm_testdir(name)
+
+    def test_814_lfsplan(self) -> None:
+        """ evaluating a hundred lfs plans against a single extsize scan """
+        name = "test_814"
+        testdir = self.rm_testdir(name)
+        repo = F"{testdir}/repo"
+        params = BenchRepo(commits=1000, files=300, bigfiles=10, depth=4, branches=1)
+        objects = mk_benchrepo(repo, params)
+        rnd = random.Random(4711)
+        patterns = ["*.txt", "*.bin", "*.dat", "*.md", "*.json", "d1/**", "d2/**", "**/d3/*.txt", "*[0-9].txt",
+                    "above=0.5", "above=2"]
+        planfile = F"{testdir}/plans.txt"
+        with open(planfile, "w") as f:
+            for num in range(100):
+                f.write(" ".join(rnd.sample(patterns, rnd.randint(1, 4))) + "\n")
+        commands: Dict[str, Dict[str, Any]] = {}
+        commands["extsize"] = run_command(repo, "extsize")
+        commands["lfsplan 100 plans"] = run_command(repo, F"lfsplan @{os.path.abspath(planfile)}")
+        for cmd, result in commands.items():
+            logg.info("%s: %-24s %8.3fs %8i KB", name, cmd, result["seconds"], result["maxrss_kb"])
+        RESULTDATA["benchmarks"][name] = {"repo": dict(params._asdict(), objects=objects, scale=SCALE),
+                                          "options": [], "commands": commands}
+        self.assertEqual(commands["lfsplan 100 plans"]["returncode"], 0)
+        self.assertLess(commands["lfsplan 100 plans"]["seconds"], commands["extsize"]["seconds"] * 2)
+        self.assertEqual(self.regressions(name, commands), [])
+        if not KEEP:
+            self.rm_testdir(name)
+
+    def test_815_shards(self) -> None:
+        """ the history traversed in parallel shards against the single rev-list - the shards are
+            capped at the cpus, so they must never take longer than the single rev-list """
+        name = "test_815"
+        testdir = self.rm_testdir(name)
+        repo = F"{testdir}/repo"
+        params = BenchRepo(commits=1000, files=300, bigfiles=10, depth=4, branches=0)
+        objects = mk_benchrepo(repo, params)
+        shards = max(2, min(8, os.cpu_count() or 1))
+        commands: Dict[str, Dict[str, Any]] = {}
+        commands["sumsize"] = run_command(repo, "sumsize")
+        commands[F"sumsize {shards} shards"] = run_command(repo, "sumsize", ["--shards", str(shards)])
+        for cmd, result in commands.items():
+            logg.info("%s: %-24s %8.3fs %8i KB", name, cmd, result["seconds"], result["maxrss_kb"])
+        RESULTDATA["benchmarks"][name] = {"repo": dict(params._asdict(), objects=objects, scale=SCALE),
+                                          "options": ["--shards", str(shards)], "commands": commands}
+        script = [sys.executable, SCRIPT, "-r", repo, "-b", BRANCH, "-g", GIT, "-o", "csv", "sumsize"]
+        serial = subprocess.check_output(script)
+        self.assertEqual(subprocess.check_output(script + ["--shards", str(shards)]), serial)
+        single = commands["sumsize"]["seconds"]
+        self.assertLessEqual(commands[F"sumsize {shards} shards"]["seconds"], single * TOLERANCE + SLACK)
+        self.assertEqual(self.regressions(name, commands), [])
+        if not KEEP:
+            self.rm_testdir(name)
+
+
+def _main_() -> int:
+    global KEEP, GIT, BRANCH, SCALE, RESULTS, BASELINE, TOLERANCE
+    from optparse import OptionParser  # pylint: disable=deprecated-module,import-outside-toplevel
+    cmdline = OptionParser("%prog [options] test*",
+                           epilog=__doc__.strip().split("\n", 1)[0])
+    cmdline.formatter.max_help_position = 28
+    cmdline.add_option("-v", "--verbose", action="count", default=0,
+                       help="increase logging level [%default]")
+    cmdline.add_option("-g", "--git", metavar="EXE", default=GIT,
+                       help="use different git client [%default]")
+    cmdline.add_option("-b", "--branch", metavar="NAME", default=BRANCH,
+                       help="use different def branch [%default]")
+    cmdline.add_option("-k", "--keep", action="count", default=0,
+                       help="keep the generated repos [%default]")
+    cmdline.add_option("-l", "--logfile", metavar="FILE", default="",
+                       help="additionally save the output log to a file [%default]")
+    cmdline.add_option("-s", "--scale", metavar="NUM", default=SCALE,
+                       help="multiply the commits of the generated repos [%default]")
+    cmdline.add_option("--results", metavar="FILE", default=RESULTS,
+                       help="save the timings as json [%default]")
+    cmdline.add_option("--baseline", metavar="FILE", default=BASELINE,
+                       help="compare with the timings of an earlier run [%default]")
+    cmdline.add_option("--tolerance", metavar="FACTOR", default=TOLERANCE,
+                       help="slower than the baseline is a regression [%default]")
+    cmdline.add_option("--failfast", action="store_true", default=False,
+                       help="Stop the test run on the first error or failure. [%default]")
+    opt, cmdline_args = cmdline.parse_args()
+    logging.basicConfig(level=logging.WARNING - opt.verbose * 5)
+    #
+    KEEP = opt.keep
+    GIT = opt.git
+    BRANCH = opt.branch
+    SCALE = float(opt.scale)
+    RESULTS = opt.results
+    BASELINE = opt.baseline
+    TOLERANCE = float(opt.tolerance)
+    #
+    LOGFILE = None
+    if opt.logfile:
+        if os.path.exists(opt.logfile):
+            os.remove(opt.logfile)
+        LOGFILE = logging.FileHandler(opt.logfile)
+        LOGFILE.setFormatter(logging.Formatter(
+            "%(levelname)s:%(relativeCreated)d:%(message)s"))
+        logging.getLogger().addHandler(LOGFILE)
+        logg.info("log diverted to %s", opt.logfile)
+    #
+    if BASELINE:
+        if os.path.exists(BASELINE):
+            with open(BASELINE) as f:
+                BASELINEDATA.update(json.load(f))
+            logg.info("baseline from %s", BASELINE)
+        else:
+            logg.warning("no baseline %s (nothing to compare)", BASELINE)
+    gitversion = output(F"{GIT} version").strip()
+    RESULTDATA.update({"python": platform.python_version(), "git": gitversion,
+                       "machine": platform.machine(), "cpus": os.cpu_count(),
+                       "date": time.strftime("%Y-%m-%d %H:%M"), "benchmarks": {}})
+    #
+    suite = unittest.TestSuite()
+    if not cmdline_args:
+        cmdline_args = ["test_*"]
+    for arg in cmdline_args:
+        for classname in sorted(globals()):
+            if not classname.endswith("Test"):
+                continue
+            testclass = globals()[classname]
+            for method in sorted(dir(testclass)):
+                if "*" not in arg:
+                    arg += "*"
+                if len(arg) > 2 and arg[1] == "_":
+                    arg = "test" + arg[1:]
+                if fnmatch(method, arg):
+                    suite.addTest(testclass(method))
+    Runner = unittest.TextTestRunner
+    RESULT = Runner(verbosity=opt.verbose,
+                    failfast=opt.failfast).run(suite)
+    if RESULTS:
+        resultsdir = os.path.dirname(RESULTS)
+        if resultsdir and not os.path.isdir(resultsdir):
+            os.makedirs(resultsdir)
+        with open(RESULTS, "w") as f:
+            json.dump(RESULTDATA, f, indent=2)
+        logg.warning("results written to %s", RESULTS)
+    if not RESULT.wasSuccessful():
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main_())
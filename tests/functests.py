@@ -11,6 +11,7 @@ from typing import Union, Optional, Tuple, List, Dict, Iterator, Iterable, cast
 import os
 import sys
 import re
+import json
 import subprocess
 import zipfile
 import inspect
@@ -18,7 +19,13 @@ import unittest
 from fnmatch import fnmatchcase as fnmatch
 import shutil
 import random
+import socket
+import time
 import logging
+from datetime import date as Date
+from datetime import datetime as Time
+from urllib.request import urlopen
+from urllib.error import HTTPError
 #
 sys.path.append(os.curdir)
 from src import git_show_bigfiles as app  # pylint: disable=wrong-import-position,import-error # nopep8
@@ -308,6 +315,37 @@ class GitBigfileTest(unittest.TestCase):
         if not KEEP:
             self.rm_testdir()
 
+    def test_105_runner(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        text_file(F"{testdir}/a.txt", gentext(20 * KB))
+        sh____(F"{git} add *.*", testdir)
+        sh____(F"{git} --no-pager commit -m 'initial'", testdir)
+        out, err, rc = app.output3(F"{git} rev-parse --verify {main}", testdir)
+        self.assertEqual((len(out.strip()), rc), (40, 0))
+        self.assertEqual(app.run_async(app.output3_async(F"{git} rev-parse --verify {main}", testdir)), (out, err, rc))
+        out, err, rc = app.run_async(app.output3_async([git, "rev-parse", "--verify", "nothing"], testdir, shell=False))
+        self.assertNotEqual(rc, 0)
+        self.assertIn("fatal", err)
+        with self.assertRaises(subprocess.TimeoutExpired):
+            app.output("sleep 5", timeout=0.1)
+        started = time.monotonic()
+        with self.assertRaises(subprocess.TimeoutExpired):
+            app.run_async(app.output3_async("sleep 5", timeout=0.1))
+        self.assertLess(time.monotonic() - started, 2)
+        # at most JOBS commands at the same time
+        app.JOBS = 2
+        try:
+            started = time.monotonic()
+            results = app.run_async(app.gather_async(app.output3_async("sleep 0.3") for num in range(4)))
+            self.assertEqual([rc for out, err, rc in results], [0, 0, 0, 0])
+            self.assertGreater(time.monotonic() - started, 0.55)
+        finally:
+            app.JOBS = 0
+        if not KEEP:
+            self.rm_testdir()
+
     def test_202_bigfile(self) -> None:
         testdir = self.mk_testdir()
         git, main = GIT, BRANCH
@@ -351,6 +389,204 @@ class GitBigfileTest(unittest.TestCase):
         if not KEEP:
             self.rm_testdir()
 
+    def test_205_streaming(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        text = gentext(20 * KB)
+        text_file(F"{testdir}/a.txt", text)
+        zip_file(F"{testdir}/b.zip", {"b.txt": text})
+        sh____(F"{git} add *.*", testdir)
+        sh____(F"{git} --no-pager commit -m 'initial'", testdir)
+        for num in range(20):
+            text_file(F"{testdir}/sub/c{num}.txt", gentext(num * KB + 1))
+            sh____(F"{git} add sub", testdir)
+            sh____(F"{git} --no-pager commit -m 'update {num}'", testdir)
+        app.REPO = testdir
+        app.MAXSIZE = MAXSIZE
+        out = output(F"{git} rev-list {main} --objects", testdir)
+        revs = [rev for rev, name in splits2(out)]
+        sizes = list(app.each_size5())
+        self.assertEqual([elem.rev for elem in sizes], revs)
+        self.assertEqual(len(sizes), 3 + 20 * 3)
+        catfile = output(F"{git} cat-file --batch-check='%(objectsize) %(objectname)'", testdir, pipe="\n".join(revs))
+        for elem, (size, rev) in zip(sizes, splits2(catfile)):
+            self.assertEqual(elem.rev, rev)
+            self.assertEqual(elem.filesize, int(size))
+        each = app.each_size5()
+        first = next(each)
+        each.close()  # type: ignore[attr-defined] # stopping early must not hang
+        self.assertEqual(first.rev, revs[0])
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_207_cache(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        text = gentext(20 * KB)
+        text_file(F"{testdir}/a.txt", text)
+        zip_file(F"{testdir}/b.zip", {"b.txt": text})
+        sh____(F"{git} add *.*", testdir)
+        sh____(F"{git} --no-pager commit -m 'initial'", testdir)
+        app.REPO = testdir
+        app.MAXSIZE = MAXSIZE
+        app.CACHE = True
+        try:
+            sizes = list(app.each_size5())
+            cachefile = F"{testdir}/.git/{app.CACHEFILE}"
+            self.assertTrue(os.path.exists(cachefile))
+            cache = app.SizeCache(cachefile, F"{testdir}/.git/objects")
+            self.assertIsNone(cache.get(sizes[1].rev))  # loose objects are not cached
+            cache.close()
+            sh____(F"{git} gc -q", testdir)
+            sizes = list(app.each_size5())
+            cache = app.SizeCache(cachefile, F"{testdir}/.git/objects")
+            self.assertEqual(cache.get(sizes[1].rev, sizes[1].name), sizes[1])
+            cache.conn.execute("UPDATE sizes SET size = 1 WHERE rev = ?", (sizes[1].rev,))
+            cache.close()
+            cached = list(app.each_size5())
+            self.assertEqual(cached[1].filesize, 1)  # not asked from cat-file
+            self.assertEqual(cached[2], sizes[2])
+            text_file(F"{testdir}/a.txt", gentext(5 * KB))
+            sh____(F"{git} --no-pager commit -m 'update' a.txt", testdir)
+            sh____(F"{git} repack -q", testdir)  # a second pack - the first one stays
+            cached = list(app.each_size5())
+            self.assertEqual(len(cached), 5)
+            self.assertEqual(dict((item.rev, item) for item in cached)[sizes[1].rev].filesize, 1)  # still cached
+            cache = app.SizeCache(cachefile, F"{testdir}/.git/objects")
+            packs = [row[0] for row in cache.conn.execute("SELECT DISTINCT pack FROM sizes")]
+            cache.close()
+            self.assertEqual(len(packs), 2)
+            sh____(F"{git} gc -q", testdir)  # repacked - the objects of both packs are dropped
+            sizes = list(app.each_size5())
+            self.assertEqual(len(sizes), 5)
+            self.assertEqual(sizes[4].filesize, 20480)
+            self.assertNotIn(1, [item.filesize for item in sizes])
+        finally:
+            app.CACHE = False
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_209_packread(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        zip_file(F"{testdir}/b.zip", {"b.txt": gentext(20 * KB)})
+        for num in range(10):
+            text_file(F"{testdir}/a.txt", gentext(20 * KB + num * 100))
+            sh____(F"{git} add *.*", testdir)
+            sh____(F"{git} --no-pager commit -m 'update {num}'", testdir)
+        sh____(F"{git} gc -q --aggressive", testdir)
+        text_file(F"{testdir}/c.txt", gentext(3 * KB))
+        sh____(F"{git} add c.txt", testdir)
+        sh____(F"{git} --no-pager commit -m 'loose'", testdir)
+        app.REPO = testdir
+        app.MAXSIZE = MAXSIZE
+        packs = app.PackReader(F"{testdir}/.git/objects")
+        batchcheck = "%(objectname) %(objecttype) %(objectsize:disk) %(objectsize) %(deltabase)"
+        catfile = output(F"{git} cat-file --batch-all-objects --batch-check='{batchcheck}'", testdir)
+        deltas = 0
+        loose = 0
+        for line in catfile.splitlines():
+            rev, typ, disk, size, base = line.split(" ")
+            found = packs.get(rev)
+            if found is None:
+                loose += 1
+                continue
+            self.assertEqual((found.typ, found.disksize, found.filesize), (typ, int(disk), int(size)))
+            if base.strip("0"):
+                deltas += 1
+        packs.close()
+        self.assertGreater(deltas, 0)
+        self.assertEqual(loose, 3)  # commit, tree, blob
+        sizes = list(app.each_size5())
+        app.PACKREAD = True
+        try:
+            self.assertEqual(list(app.each_size5()), sizes)
+        finally:
+            app.PACKREAD = False
+        sh____(F"{git} -c pack.writeReverseIndex=true repack -q -a -d", testdir)
+        packs = app.PackReader(F"{testdir}/.git/objects")
+        self.assertEqual(len(packs.packs), 1)
+        pack = packs.packs[0]
+        self.assertIsNotNone(pack.revindex())
+        self.assertIsNone(pack.ends)  # not before the first lookup
+        for line in output(F"{git} cat-file --batch-all-objects --batch-check='{batchcheck}'", testdir).splitlines():
+            rev, typ, disk, size, base = line.split(" ")
+            found = packs.get(rev)
+            self.assertIsNotNone(found)
+            if found is not None:
+                self.assertEqual((found.typ, found.disksize, found.filesize), (typ, int(disk), int(size)))
+        self.assertEqual(list(pack.ends or [])[:-1], sorted(pack.offsets()))
+        packs.close()
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_211_allrefs(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        text = gentext(20 * KB)
+        text_file(F"{testdir}/a.txt", text)
+        zip_file(F"{testdir}/b.zip", {"b.txt": text})
+        sh____(F"{git} add *.*", testdir)
+        sh____(F"{git} --no-pager commit -m 'initial'", testdir)
+        for num in range(5):
+            sh____(F"{git} checkout -q -b maint{num} {main}", testdir)
+            text_file(F"{testdir}/m{num}.txt", gentext(num * KB + 1))
+            sh____(F"{git} add m{num}.txt", testdir)
+            sh____(F"{git} --no-pager commit -m 'maint {num}'", testdir)
+            sh____(F"{git} tag v{num}", testdir)
+        sh____(F"{git} checkout -q {main}", testdir)
+        app.REPO = testdir
+        app.MAXSIZE = MAXSIZE
+        out = output(F"{git} rev-list --all --objects", testdir)
+        allrevs = set(rev for rev, name in splits2(out))
+        self.assertEqual(len(allrevs), 3 + 5 * 2)
+        app.REFS = ["refs"]
+        try:
+            for jobs in [1, 2, 4]:
+                app.JOBS = jobs
+                sizes = list(app.each_size5())
+                self.assertEqual(len(sizes), len(allrevs))  # each object once
+                self.assertEqual(set(elem.rev for elem in sizes), allrevs)
+            names = set(elem.name for elem in sizes)
+            self.assertEqual(names, set(["", "a.txt", "b.zip"] + [F"m{num}.txt" for num in range(5)]))
+            app.REFS = ["refs/tags/v1"]
+            sizes = list(app.each_size5())
+            self.assertEqual(len(sizes), 3 + 2)
+        finally:
+            app.REFS = []
+            app.JOBS = 0
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_212_inventory(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        for num in range(10):
+            text_file(F"{testdir}/a.txt", gentext(num * KB + 100))
+            text_file(F"{testdir}/sub/b.txt", gentext(num + 1))
+            sh____(F"{git} add .", testdir)
+            sh____(F"{git} --no-pager commit -m 'change {num}'", testdir)
+        app.REPO = testdir
+        app.MAXSIZE = MAXSIZE
+        sizes = list(app.each_size5())
+        self.assertEqual(len(sizes), 10 * 4)
+        inventory = app.get_inventory()
+        self.assertEqual(len(inventory), len(sizes))
+        self.assertEqual(list(inventory), sizes)
+        self.assertEqual(inventory[0], sizes[0])
+        self.assertEqual(inventory[-1], sizes[-1])
+        self.assertEqual(sorted(inventory.paths), ["", "a.txt", "sub", "sub/b.txt"])
+        self.assertEqual(inventory.typenames, ["tree", "blob"])
+        self.assertEqual(inventory.hashsize, 20)
+        self.assertEqual(inventory.nbytes(), len(sizes) * (20 + 1 + 8 + 8 + 4))
+        if not KEEP:
+            self.rm_testdir()
+
     def test_213_bigfile(self) -> None:
         testdir = self.mk_testdir()
         git, main = GIT, BRANCH
@@ -380,6 +616,93 @@ class GitBigfileTest(unittest.TestCase):
         if not KEEP:
             self.rm_testdir()
 
+    def test_214_sizer(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        for num in range(3):
+            text_file(F"{testdir}/a{num}.txt", gentext((num + 1) * KB + num))
+        sh____(F"{git} add .", testdir)
+        sh____(F"{git} --no-pager commit -m 'initial'", testdir)
+        app.REPO = testdir
+        sizes = list(app.each_size5())
+        blobs = [(item.rev, item.name) for item in sizes if item.typ == "blob"]
+        with app.GitObjectSizer(testdir, cachesize=2, chunk=2) as sizer:
+            self.assertEqual(list(sizer.sizes(blobs)), [item for item in sizes if item.typ == "blob"])
+            self.assertEqual(sizer.asked, 3)
+            assert sizer.run is not None
+            pid = sizer.run.pid
+            found = sizer.get(blobs[2][0], "a2.txt")
+            assert found is not None
+            self.assertEqual(found.filesize, 3 * KB + 2)
+            self.assertEqual((sizer.asked, sizer.hits), (3, 1))  # from the LRU
+            found = sizer.get("HEAD:a0.txt")
+            assert found is not None
+            self.assertEqual((found.rev, found.filesize), (blobs[0][0], 1 * KB))
+            self.assertIsNone(sizer.get("0" * 40))
+            many = sizer.ask([blobs[0][0]] * 5000)  # more than the pipes can buffer
+            self.assertEqual(len([found for found in many if found is not None]), 5000)
+            self.assertEqual(len(sizer.cache), 2)
+            self.assertEqual(list(app.each_size5()), sizes)  # the each_* functions use the open sizer
+            self.assertEqual(sizer.run.pid, pid)
+            self.assertGreater(sizer.asked, 5)
+            run = sizer.run
+        self.assertIsNone(sizer.run)
+        self.assertEqual(run.returncode, 0)
+        self.assertEqual(app.SIZERS, {})
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_215_shards(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        rnd = random.Random(4711)
+        for num in range(12):
+            folder = F"d{num % 3}"
+            if num % 4 == 3:
+                sh____(F"{git} checkout -q -b side{num} HEAD~2", testdir)
+                folder = "side"
+            text_file(F"{testdir}/{folder}/f{rnd.randrange(5)}.txt", gentext(rnd.randint(1, 4) * KB + num))
+            if num == 5:
+                sh____(F"{git} mv d1 moved", testdir)  # the same trees under another path
+                text_file(F"{testdir}/copy.txt", gentext(1 * KB))  # the same blob as d*/f*.txt
+            sh____(F"{git} add .", testdir)
+            sh____(F"{git} --no-pager commit -q -m 'change {num}'", testdir)
+            if num % 4 == 3:
+                sh____(F"{git} checkout -q {main}", testdir)
+                sh____(F"{git} merge -q --no-edit side{num}", testdir)
+        app.REPO = testdir
+        app.MAXSIZE = 3 * KB / MB
+        app.JOBS = 100  # the shards are capped at the jobs (the cpu count)
+        try:
+            for filtered in ["", app.BLOBS, app.OVERSIZE]:
+                serial = list(app.each_size5(filtered))
+                self.assertGreater(len(serial), 0)
+                self.assertIn("moved", [item.name.split("/")[0] for item in serial] if filtered != app.OVERSIZE else ["moved"])
+                for shards in [2, 3, 5, 100]:
+                    app.SHARDS = shards
+                    self.assertEqual(list(app.each_size5(filtered)), serial)  # same objects, names and order
+                app.SHARDS = 0
+            app.BRANCH = F"HEAD~3..{main}"
+            serial = list(app.each_size5())
+            app.SHARDS = 3
+            self.assertEqual(list(app.each_size5()), serial)  # a range is not sharded
+            app.BRANCH = main
+            app.REFS = ["refs/heads"]
+            app.SHARDS = 0
+            refs = list(app.each_size5())
+            app.SHARDS = 3
+            self.assertEqual(list(app.each_size5()), refs)  # the refs are not sharded
+        finally:
+            app.SHARDS = 0
+            app.JOBS = 0
+            app.MAXSIZE = MAXSIZE
+            app.BRANCH = main
+            app.REFS = []
+        if not KEEP:
+            self.rm_testdir()
+
     def test_233_bigfile(self) -> None:
         testdir = self.mk_testdir()
         git, main = GIT, BRANCH
@@ -441,6 +764,163 @@ class GitBigfileTest(unittest.TestCase):
         if not KEEP:
             self.rm_testdir()
 
+    def test_236_storeoversize(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        text5 = gentext(5 * KB)
+        text20 = gentext(20 * KB)
+        text_file(F"{testdir}/a.txt", text20)
+        zip_file(F"{testdir}/b.zip", {"b.txt": text20})
+        sh____(F"{git} add *.*", testdir)
+        sh____(F"{git} --no-pager commit -m 'initial'", testdir)
+        text_file(F"{testdir}/a.txt", text5)
+        sh____(F"{git} --no-pager commit -m 'update' a.txt", testdir)
+        text_file(F"{testdir}/lost.txt", gentext(30 * KB))
+        lost = output(F"{git} hash-object -w lost.txt", testdir).strip()
+        sh____(F"{git} gc -q", testdir)
+        app.REPO = testdir
+        app.MAXSIZE = 0.011
+        sizes = sorted(app.each_storeoversize5(), key=lambda x: x.filesize)
+        for n, elem in enumerate(sizes):
+            logg.info("sizes[%i] = %s", n, elem)
+        self.assertEqual(len(sizes), 3)  # not the 5 KB file
+        self.assertEqual(sizes[0].name, "a.txt")
+        self.assertEqual(sizes[1].name, "b.zip")
+        self.assertEqual(sizes[2].name, "")  # unreachable
+        self.assertEqual(sizes[2].rev, lost)
+        self.assertEqual(sizes[0].filesize, 20480)
+        self.assertEqual(sizes[1].filesize, 20588)
+        self.assertEqual(sizes[2].filesize, 30 * KB)
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_238_filtered(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        text5 = gentext(5 * KB)
+        text20 = gentext(20 * KB)
+        text_file(F"{testdir}/a.txt", text20)
+        text_file(F"{testdir}/sub/c.txt", text5)
+        zip_file(F"{testdir}/b.zip", {"b.txt": text20})
+        sh____(F"{git} add .", testdir)
+        sh____(F"{git} --no-pager commit -m 'initial'", testdir)
+        text_file(F"{testdir}/a.txt", text5 + "x")
+        sh____(F"{git} --no-pager commit -m 'update' a.txt", testdir)
+        sh____(F"{git} checkout -q -b side", testdir)
+        text_file(F"{testdir}/d.txt", text20 + "y")
+        sh____(F"{git} add d.txt", testdir)
+        sh____(F"{git} --no-pager commit -m 'side'", testdir)
+        sh____(F"{git} checkout -q {main}", testdir)
+        app.REPO = testdir
+        app.MAXSIZE = 0.01
+        self.assertEqual(int(app.MAXSIZE * app.MB), 10485)
+        sizes = list(app.each_size5())
+        blobs = list(app.each_size5(app.BLOBS))
+        self.assertEqual(blobs, [elem for elem in sizes if elem.typ == "blob"])
+        oversize = list(app.each_size5(app.OVERSIZE))
+        self.assertEqual(oversize, [elem for elem in blobs if elem.filesize >= app.MAXSIZE * app.MB])
+        self.assertEqual([elem.name for elem in oversize], ["b.zip", "a.txt"])
+        app.REFS = ["refs"]
+        try:
+            oversize = list(app.each_size5(app.OVERSIZE))
+            self.assertEqual(sorted(elem.name for elem in oversize), ["a.txt", "b.zip", "d.txt"])
+            app.MAXSIZE = 1
+            self.assertEqual(list(app.each_size5(app.OVERSIZE)), [])
+        finally:
+            app.REFS = []
+            app.MAXSIZE = MAXSIZE
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_240_prereceive(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        text_file(F"{testdir}/a.txt", gentext(20 * KB))
+        sh____(F"{git} add .", testdir)
+        sh____(F"{git} --no-pager commit -m 'initial'", testdir)
+        old = output(F"{git} rev-parse HEAD", testdir).strip()
+        text_file(F"{testdir}/b.txt", gentext(30 * KB))
+        text_file(F"{testdir}/c.txt", gentext(3 * KB))
+        sh____(F"{git} add .", testdir)
+        tree = output(F"{git} write-tree", testdir).strip()
+        new = output(F"{git} commit-tree {tree} -p {old} -m 'push'", testdir).strip()
+        app.REPO = testdir
+        app.MAXSIZE = 0.01
+        zero = "0" * 40
+        found = list(app.each_prereceive5([F"{old} {new} refs/heads/{main}"]))
+        self.assertEqual([(elem.name, elem.filesize) for elem in found], [("b.txt", 30 * KB)])
+        found = list(app.each_prereceive5([F"{zero} {new} refs/heads/topic"]))
+        self.assertEqual([elem.name for elem in found], ["b.txt"])  # a.txt is known already
+        self.assertEqual(list(app.each_prereceive5([F"{old} {zero} refs/heads/{main}"])), [])
+        report, exitcode = app.get_prereceive([F"{old} {new} refs/heads/{main}"])
+        self.assertEqual(exitcode, 1)
+        self.assertIn("b.txt", report)
+        app.GITVERSIONS[app.GIT] = (2, 18)  # no blob:limit filter to push the size check down to git
+        try:
+            found = list(app.each_prereceive5([F"{old} {new} refs/heads/{main}"]))
+            self.assertEqual([(elem.name, elem.filesize) for elem in found], [("b.txt", 30 * KB)])
+        finally:
+            app.GITVERSIONS.clear()
+        app.MAXSIZE = 1
+        self.assertEqual(app.get_prereceive([F"{old} {new} refs/heads/{main}"]), ("", 0))
+        # as a real hook on a server
+        server = F"{testdir}/server.git"
+        sh____(F"{git} init -q --bare -b {main} {server}")
+        script = os.path.abspath(app.__file__)
+        text_file(F"{server}/hooks/pre-receive", F"#! /bin/sh\nexec {sys.executable} {script} -x 0.025 prereceive\n")
+        os.chmod(F"{server}/hooks/pre-receive", 0o755)
+        sh____(F"{git} push -q server.git {old}:refs/heads/{main}", testdir)
+        out, err, rc = output3(F"{git} push server.git {new}:refs/heads/{main}", testdir)
+        self.assertNotEqual(rc, 0)
+        self.assertIn("b.txt", err)
+        self.assertIn("rejected", err)
+        self.assertEqual(output(F"{git} rev-parse {main}", server).strip(), old)
+        app.MAXSIZE = MAXSIZE
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_241_staged(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        text_file(F"{testdir}/a.txt", gentext(20 * KB))
+        text_file(F"{testdir}/b.bin", gentext(1 * KB))
+        sh____(F"{git} add .", testdir)
+        app.REPO = testdir
+        app.MAXSIZE = 0.01
+        found = list(app.each_staged5())
+        self.assertEqual([(elem.name, elem.filesize) for elem in found], [("a.txt", 20 * KB)])
+        sh____(F"{git} --no-pager commit -m 'initial'", testdir)
+        self.assertEqual(list(app.each_staged5()), [])  # nothing staged
+        text_file(F"{testdir}/c.txt", gentext(30 * KB))
+        text_file(F"{testdir}/b.bin", gentext(2 * KB))
+        sh____(F"{git} add .", testdir)
+        sh____(F"{git} rm -q a.txt", testdir)
+        found = list(app.each_staged5())
+        self.assertEqual([elem.name for elem in found], ["c.txt"])
+        app.EXT = ".bin"
+        report, exitcode = app.get_staged()
+        self.assertEqual(exitcode, 1)
+        self.assertIn("b.bin", report)
+        self.assertIn("c.txt", report)
+        app.EXT = ""
+        app.MAXSIZE = 1
+        self.assertEqual(app.get_staged(), ("", 0))
+        # as a real hook in the repo
+        script = os.path.abspath(app.__file__)
+        text_file(F"{testdir}/.git/hooks/pre-commit", F"#! /bin/sh\nexec {sys.executable} {script} -x 0.01 staged\n")
+        os.chmod(F"{testdir}/.git/hooks/pre-commit", 0o755)
+        out, err, rc = output3(F"{git} --no-pager commit -m 'big'", testdir)
+        self.assertNotEqual(rc, 0)
+        self.assertIn("c.txt", out + err)
+        self.assertEqual(output(F"{git} log --format=%s", testdir).split(), ["initial"])
+        app.MAXSIZE = MAXSIZE
+        if not KEEP:
+            self.rm_testdir()
+
     def test_313_bigfile(self) -> None:
         testdir = self.mk_testdir()
         git, main = GIT, BRANCH
@@ -466,6 +946,152 @@ class GitBigfileTest(unittest.TestCase):
         if not KEEP:
             self.rm_testdir()
 
+    def test_316_incremental(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        text = gentext(20 * KB)
+        text_file(F"{testdir}/a.txt", text)
+        zip_file(F"{testdir}/b.zip", {"b.txt": text})
+        sh____(F"{git} add *.*", testdir)
+        sh____(F"{git} --no-pager commit -m 'initial'", testdir)
+        app.REPO = testdir
+        app.MAXSIZE = MAXSIZE
+        full = list(app.each_sumsize5())
+        app.INCREMENTAL = True
+        try:
+            sizes = list(app.each_sumsize5())
+            self.assertEqual(sizes, full)
+            self.assertTrue(os.path.exists(F"{testdir}/.git/show-bigfiles.{main}.json"))
+            text_file(F"{testdir}/a.txt", gentext(5 * KB))
+            sh____(F"{git} --no-pager commit -m 'update' a.txt", testdir)
+            text_file(F"{testdir}/dummyfile", gentext(8 * KB))
+            sh____(F"{git} add dummyfile", testdir)
+            sh____(F"{git} --no-pager commit -m 'dummy'", testdir)
+            sizes = list(app.each_sumsize5())
+            extsizes = list(app.each_extsize5())
+            app.INCREMENTAL = False
+            full = list(app.each_sumsize5())
+            self.assertEqual(sorted(sizes), sorted(full))
+            self.assertEqual(sorted(extsizes), sorted(app.each_extsize5()))
+            app.INCREMENTAL = True
+            self.assertEqual(sorted(app.each_sumsize5()), sorted(full))  # nothing new
+            sh____(F"{git} reset --hard HEAD~2", testdir)
+            text_file(F"{testdir}/c.txt", gentext(3 * KB))
+            sh____(F"{git} add c.txt", testdir)
+            sh____(F"{git} --no-pager commit -m 'force'", testdir)
+            sizes = list(app.each_sumsize5())
+            app.INCREMENTAL = False
+            full = list(app.each_sumsize5())
+            self.assertEqual(sorted(sizes), sorted(full))  # rescanned
+            self.assertEqual(len(full), 3)
+            self.assertEqual(sizes[0].filesum, 20480)
+            sh____(F"{git} branch old HEAD@{{2}}", testdir)
+            app.REFS = ["refs/heads"]
+            app.INCREMENTAL = True
+            sizes = list(app.each_sumsize5())
+            app.INCREMENTAL = False
+            self.assertEqual(sorted(sizes), sorted(app.each_sumsize5()))  # not from the stored scan of main
+            self.assertEqual(len(sizes), 4)
+            script = os.path.abspath(app.__file__)
+            out, err, rc = output3(F"{sys.executable} {script} -r {testdir} -I --all sumsize")
+            self.assertEqual(rc, 2)
+            self.assertIn("--incremental", err)
+        finally:
+            app.INCREMENTAL = False
+            app.REFS = []
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_317_growth(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        def commit(when: str, message: str) -> None:
+            sh____(F"{git} add .", testdir)
+            sh____(F"GIT_COMMITTER_DATE='{when}T12:00:00Z' {git} --no-pager commit -m '{message}'", testdir)
+        text_file(F"{testdir}/a.txt", gentext(10 * KB))
+        text_file(F"{testdir}/b.dat", gentext(4 * KB))
+        commit("2024-01-10", "january")
+        text_file(F"{testdir}/a.txt", gentext(12 * KB))
+        commit("2024-02-10", "february")
+        sh____(F"{git} checkout -b side HEAD~1", testdir)
+        text_file(F"{testdir}/c.dat", gentext(6 * KB))
+        commit("2024-03-10", "side")
+        sh____(F"{git} checkout {main}", testdir)
+        sh____(F"GIT_COMMITTER_DATE='2024-04-10T12:00:00Z' {git} merge --no-edit side", testdir)
+        app.REPO = testdir
+        rows = [(item.period, item.ext, item.blobs, item.filesize, item.filetotal) for item in app.each_growth7()]
+        self.assertEqual(rows, [
+            ("2024-01", ".dat", 1, 4 * KB, 4 * KB), ("2024-01", ".txt", 1, 10 * KB, 10 * KB),
+            ("2024-01", "*", 2, 14 * KB, 14 * KB),
+            ("2024-02", ".txt", 1, 12 * KB, 22 * KB), ("2024-02", "*", 1, 12 * KB, 26 * KB),
+            ("2024-03", ".dat", 1, 6 * KB, 10 * KB), ("2024-03", "*", 1, 6 * KB, 32 * KB)])  # the merge has no new blob
+        disktotal = sum(item.disksum for item in app.each_sumsize4())
+        self.assertEqual([item.disktotal for item in app.each_growth7()][-1], disktotal)
+        app.PERIOD = "year"
+        try:
+            self.assertEqual([item[:3] for item in app.each_growth7()][-1], ("2024", "*", 4))
+        finally:
+            app.PERIOD = "month"
+        script = os.path.abspath(app.__file__)
+        out, err, rc = output3(F"{sys.executable} {script} -r {testdir} --period=bogus growth")
+        self.assertEqual(rc, 2)
+        self.assertIn("invalid choice: 'bogus'", err)
+        app.INCREMENTAL = True
+        try:
+            self.assertEqual(list(app.each_growth7()), list(app.each_growth7()))  # stored and reused
+            self.assertTrue(os.path.exists(F"{testdir}/.git/show-bigfiles.growth.{main}.json"))
+            text_file(F"{testdir}/d.txt", gentext(3 * KB))
+            commit("2024-05-10", "may")
+            text_file(F"{testdir}/e.txt", gentext(3 * KB) + "\n")
+            commit("2024-05-11", "may again")
+            growth = list(app.each_growth7())
+            app.INCREMENTAL = False
+            self.assertEqual(growth, list(app.each_growth7()))
+            self.assertEqual(growth[-2][:3], ("2024-05", ".txt", 2))
+        finally:
+            app.INCREMENTAL = False
+        text_file(F"{testdir}/:colon.txt", gentext(1 * KB))  # not a raw meta field
+        text_file(F"{testdir}/\nnewline.txt", gentext(2 * KB))
+        commit("2024-06-10", "odd names")
+        names = [name for rev, name, header in app.each_newblob3("HEAD^!", set())]
+        self.assertEqual(sorted(names), ["\nnewline.txt", ":colon.txt"])
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_318_commitsize(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        def commit(author: str, message: str) -> None:
+            sh____(F"{git} add .", testdir)
+            sh____(F"{git} --no-pager commit --author='{author} <{author}@x>' -m '{message}'", testdir)
+        text_file(F"{testdir}/a.txt", gentext(10 * KB))
+        commit("alice", "initial")
+        text_file(F"{testdir}/b.txt", gentext(30 * KB))
+        text_file(F"{testdir}/c.txt", gentext(2 * KB))
+        commit("bob", "balloon")
+        text_file(F"{testdir}/d.txt", gentext(10 * KB))  # same blob as a.txt
+        commit("alice", "copy")
+        text_file(F"{testdir}/a.txt", gentext(5 * KB))
+        commit("alice", "shrink")
+        app.REPO = testdir
+        commits = list(app.each_commitsize7())
+        self.assertEqual([(item.filesum, item.blobs, item.author) for item in commits], [
+            (10 * KB, 1, "alice@x"), (32 * KB, 2, "bob@x"), (5 * KB, 1, "alice@x")])  # the copy added no blob
+        self.assertEqual(commits[1].rev, output(F"{git} rev-parse HEAD~2", testdir).strip())
+        self.assertEqual([item.rev for item in app.each_commitsize7(top=1)], [commits[1].rev])
+        authors = dict((item.author, item) for item in app.each_authorsize6())
+        self.assertEqual((authors["alice@x"].filesum, authors["alice@x"].commits), (15 * KB, 2))
+        self.assertEqual((authors["bob@x"].blobs, authors["bob@x"].name), (2, "bob"))
+        self.assertEqual(sum(item.disksum for item in authors.values()), sum(item.disksum for item in commits))
+        mails = list(app.each_mail2())
+        self.assertEqual(len(mails), len(set(mails)))
+        self.assertEqual(sorted(item.email for item in mails if isinstance(item, app.Author2)), ["alice@x", "bob@x"])
+        if not KEEP:
+            self.rm_testdir()
+
     def test_333_bigfile(self) -> None:
         testdir = self.mk_testdir()
         git, main = GIT, BRANCH
@@ -627,6 +1253,136 @@ class GitBigfileTest(unittest.TestCase):
         if not KEEP:
             self.rm_testdir()
 
+    def test_511_mappings(self) -> None:
+        testdir = self.mk_testdir()
+        def map_fnmatch(name: str, mappings: str) -> str:
+            for line in mappings.splitlines():
+                if "=" in line:
+                    mapped1, pattern1 = line.split("=", 1)
+                    mapped, pattern = mapped1.strip(), pattern1.strip()
+                    if fnmatch(name, pattern):
+                        return mapped
+                    if pattern.startswith("*/") and "/" not in name:
+                        if fnmatch(name, pattern[2:]):
+                            return mapped
+            return ""
+        names = ["Jenkinsfile", "ci/Jenkinsfile", "ci/Jenkinsfile_nightly", "Makefile", "src/Makefile.am",
+                 "README", "doc/README.md", "x/LICENSE", "COPYING.LIB", ".suo", "a/.gitignore", "DataSync_debug",
+                 "bin/simtaskmanager", "bin/simtaskmanager2", "src/Jenkinsfile/x", "other", "a/b/c", ""]
+        mapper = app.ExtMapper(app.MAPPINGS)
+        for name in names:
+            self.assertEqual(mapper.get(name), map_fnmatch(name, app.MAPPINGS), name)
+            self.assertEqual(app.map_ext(name, ""), map_fnmatch(name, app.MAPPINGS), name)
+        self.assertEqual(app.map_ext("Makefile", ".mk"), ".mk")
+        self.assertEqual(app.map_splitext("src/Makefile"), ("src/Makefile", "makefile"))
+        text_file(F"{testdir}/mappings.txt", "cmake= */CMakeLists.txt\nmakefile.top= Makefile\nbuild= */BUILD*\n")
+        mappings = app.load_mappings(F"{testdir}/mappings.txt") + app.MAPPINGS
+        mapper = app.ExtMapper(mappings)
+        for name in names + ["CMakeLists.txt", "x/CMakeLists.txt", "BUILD.bazel", "y/BUILD"]:
+            self.assertEqual(mapper.get(name), map_fnmatch(name, mappings), name)
+        self.assertEqual(mapper.get("Makefile"), "makefile.top")
+        self.assertEqual(mapper.get("src/Makefile"), "makefile")
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_521_lfsplan(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        zip_file(F"{testdir}/a.zip", {"a.txt": gentext(30 * KB)})
+        text_file(F"{testdir}/docs/c.psd", gentext(40 * KB))
+        text_file(F"{testdir}/d.txt", gentext(5 * KB))
+        text_file(F"{testdir}/sub/big file.txt", gentext(50 * KB))
+        sh____(F"{git} add .", testdir)
+        sh____(F"{git} --no-pager commit -m 'initial'", testdir)
+        zip_file(F"{testdir}/sub/b.zip", {"b.txt": gentext(20 * KB)})
+        zip_file(F"{testdir}/a.zip", {"a.txt": gentext(31 * KB)})
+        sh____(F"{git} add .", testdir)
+        sh____(F"{git} --no-pager commit -m 'second'", testdir)
+        app.REPO = testdir
+        blobs = [item for item in app.each_size5(app.BLOBS) if item.typ == "blob"]
+        disks: Dict[str, int] = {}
+        for item in blobs:
+            disks[item.name] = disks.get(item.name, 0) + item.disksize
+        total = sum(disks.values())
+        planner = app.LfsPlanner(app.each_pathsize3())
+        self.assertEqual(planner.total, total)
+        plan = planner.evaluate("*.zip")
+        self.assertEqual(plan.moved, disks["a.zip"] + disks["sub/b.zip"])
+        self.assertEqual(plan.remaining, total - plan.moved)
+        self.assertEqual((plan.files, plan.changes), (2, 3))
+        self.assertEqual(planner.evaluate("/*.zip").files, 1)
+        self.assertEqual(planner.evaluate("docs/*.psd,/d.txt").files, 2)
+        self.assertEqual(planner.evaluate("**/*.psd").files, 1)
+        self.assertEqual(planner.evaluate("sub/**").files, 2)
+        self.assertEqual(planner.evaluate("*.[tp]s?").files, 1)
+        self.assertEqual(planner.evaluate("above=0.045").files, 1)  # sub/big file.txt
+        self.assertEqual(planner.evaluate("*.zip above=0.035").files, 4)
+        plans = app.get_lfsplans(["*.zip", "*.zip *.psd", "above=0.035"])
+        self.assertEqual(planner.best(plans[:2], 0).plan, "*.zip")  # the psd is below the zip bytes per file
+        self.assertEqual(planner.best(plans, 0).plan, "above=0.035")  # the densest plan
+        self.assertEqual(planner.best(plans[:2], 0.5).plan, "*.zip *.psd")  # only the superset reaches the target
+        self.assertEqual(planner.best(plans, 0.5).plan, "above=0.035")  # fewer files reach it too
+        self.assertEqual(planner.best(plans[:2], 0.1).plan, "*.zip")  # no plan reaches it - the densest
+        self.assertEqual(planner.gitattributes("*.zip above=0.045").splitlines(), [
+            "# lfs plan: *.zip above=0.045",
+            "*.zip filter=lfs diff=lfs merge=lfs -text",
+            "/sub/big[[:space:]]file.txt filter=lfs diff=lfs merge=lfs -text"])
+        self.assertEqual(len(planner.matched), 10)  # each pattern was matched once
+        self.assertEqual(planner.candidates()[:4], ["*.zip", "*.zip *.txt", "*.zip *.txt *.psd", "above=%s" % app.MAXSIZE])
+        script = os.path.abspath(app.__file__)
+        out = output(F"{sys.executable} {script} -r {testdir} -o csv lfsplan '*.zip' '*.zip *.psd'")
+        self.assertEqual(out.splitlines()[1].split(";")[-1], "*.zip *.psd")
+        out = output(F"{sys.executable} {script} -r {testdir} lfsattributes '*.zip' '*.zip *.psd'")
+        self.assertNotIn("*.psd filter=lfs", out)
+        out = output(F"{sys.executable} {script} -r {testdir} --lfstarget=0.5 lfsattributes '*.zip' '*.zip *.psd'")
+        self.assertIn("*.psd filter=lfs", out)
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_522_deltas(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        for num in range(4):
+            text_file(F"{testdir}/a.txt", gentext(20 * KB) + F"\nchange {num}\n")
+            text_file(F"{testdir}/Makefile", F"all: {num}\n")  # zlib makes it larger
+            with open(F"{testdir}/b.bin", "wb") as f:
+                f.write(os.urandom(80 * KB))
+            if not num:
+                with open(F"{testdir}/once.bin", "wb") as f:
+                    f.write(os.urandom(80 * KB))
+            sh____(F"{git} add .", testdir)
+            sh____(F"{git} --no-pager commit -m 'change {num}'", testdir)
+        sh____(F"{git} repack -adf -q", testdir)
+        app.REPO = testdir
+        deltas = dict((item.name, item) for item in app.each_deltasize8())
+        self.assertEqual(deltas["a.txt"].changes, 4)
+        self.assertEqual(deltas["a.txt"].fulls, 1)  # the others are deltified
+        self.assertGreater(deltas["a.txt"].depth, 0)
+        self.assertEqual(deltas["a.txt"].partial, 0)
+        self.assertLess(deltas["a.txt"].ratio, 0.5)
+        self.assertEqual((deltas["b.bin"].fulls, deltas["b.bin"].depth), (4, 0))
+        self.assertGreater(deltas["b.bin"].ratio, app.FULLRATIO)
+        self.assertGreater(deltas["Makefile"].ratio, 1)
+        self.assertEqual(deltas["once.bin"].fulls, 1)
+        self.assertEqual([item.name for item in app.each_fullcopies8()], ["b.bin"])  # not Makefile or once.bin
+        exts = dict((item.ext, item) for item in app.each_extdelta9())
+        self.assertEqual(exts[".bin"].disksum, deltas["b.bin"].disksum + deltas["once.bin"].disksum)
+        self.assertEqual(exts[".txt"].files, "1/files")
+        app.BRANCH = F"{main}~3"  # the first a.txt is a delta of a later one
+        try:
+            deltas = dict((item.name, item) for item in app.each_deltasize8())
+        finally:
+            app.BRANCH = main
+        self.assertEqual((deltas["a.txt"].changes, deltas["a.txt"].partial), (1, 1))
+        self.assertGreater(deltas["a.txt"].depth, 0)
+        script = os.path.abspath(app.__file__)
+        out = output(F"{sys.executable} {script} -r {testdir} -o csv deltasize fullcopies")
+        self.assertEqual(len([line for line in out.splitlines() if line.endswith(";b.bin")]), 2)
+        if not KEEP:
+            self.rm_testdir()
+
     def test_515_bigfile(self) -> None:
         testdir = self.mk_testdir()
         git, main = GIT, BRANCH
@@ -652,6 +1408,264 @@ class GitBigfileTest(unittest.TestCase):
         if not KEEP:
             self.rm_testdir()
 
+    def test_601_reports(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        text = gentext(20 * KB)
+        text_file(F"{testdir}/a.txt", text)
+        zip_file(F"{testdir}/b.zip", {"b.txt": text})
+        sh____(F"{git} add *.*", testdir)
+        sh____(F"{git} --no-pager commit -m 'initial'", testdir)
+        text_file(F"{testdir}/a.txt", gentext(5 * KB))
+        sh____(F"{git} --no-pager commit -m 'update' a.txt", testdir)
+        text_file(F"{testdir}/dummyfile", gentext(8 * KB))
+        sh____(F"{git} add dummyfile", testdir)
+        sh____(F"{git} --no-pager commit -m 'dummy'", testdir)
+        app.REPO = testdir
+        app.MAXSIZE = 0.011
+        expected: List[List[object]] = [list(app.each_sumsize4()), list(app.each_extsize4()), list(app.each_oversize5()),
+                                        list(app.each_noext1()), list(app.each_extoversize4())]
+        scans = []
+        each_size5 = app.each_size5
+        def counting(filtered: str = "") -> Iterator[app.HistSize5]:
+            scans.append(1)
+            return each_size5(filtered)
+        app.each_size5 = counting  # type: ignore[assignment]
+        try:
+            reports = [app.REPORTS[cmd]() for cmd in ["sumsize", "extsize", "oversize", "noext", "extoversize"]]
+            app.scan_reports(reports)
+        finally:
+            app.each_size5 = each_size5  # type: ignore[assignment]
+        self.assertEqual(len(scans), 1)
+        self.assertEqual([list(report.each()) for report in reports], expected)
+        self.assertEqual(len(expected[1]), 3)
+        self.assertEqual(len(expected[2]), 2)
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_602_stream(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        for num in range(5):
+            text_file(F"{testdir}/f{num}.txt", gentext(num * KB + 100))
+        sh____(F"{git} add .", testdir)
+        sh____(F"{git} --no-pager commit -m 'initial'", testdir)
+        app.REPO = testdir
+        app.MAXSIZE = MAXSIZE
+        headers = ["filesize"]
+        sizes = sorted(app.each_size5(app.BLOBS), key=lambda x: x.filesize)
+        formats = {"filesize": " {:_}"}
+        for fmt in ["csv", "tab", "dat", "jsonl"]:
+            out = StringIO()
+            count = app.tabToStream(fmt, iter(sizes), headers, formats, out=out)  # type: ignore[arg-type]
+            self.assertEqual(count, 5)
+            self.assertEqual(out.getvalue(), app.tabToFMT(fmt, sizes, headers, formats), fmt)  # type: ignore[arg-type]
+        out = StringIO()
+        app.tabToStream("jsonl", app.each_size5(app.BLOBS), headers, out=out)  # type: ignore[arg-type]
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row["name"] for row in rows], [F"f{num}.txt" for num in range(5)])
+        self.assertEqual(rows[4]["filesize"], 4 * KB + 100)
+        cells = [{"name": "a", "lfs": True, "old": False, "day": Date(2024, 2, 29), "seen": Time(2024, 2, 29, 13, 5),
+                  "part": 0.25, "size": 1234567, "note": None, "kind": "blob"}]
+        formats = {"size": " {:_}", "kind": "<%s>", "part": "{:.0%}"}
+        for fmt in ["csv", "tab", "dat", "jsonl"]:
+            out = StringIO()
+            app.tabToStream(fmt, iter(cells), ["name"], formats, out=out)  # type: ignore[arg-type]
+            self.assertEqual(out.getvalue(), app.tabToFMT(fmt, cells, ["name"], formats), fmt)  # type: ignore[arg-type]
+        out = StringIO()
+        app.tabToStream("csv", iter(cells), ["name"], formats, out=out)  # type: ignore[arg-type]
+        self.assertEqual(out.getvalue().splitlines()[1].split(";"),
+                         ["a", "2024-02-29", "<blob>", "(yes)", "~", "(no)", "25%", "2024-02-29.1305", " 1_234_567"])
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_603_top(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        for num in range(8):
+            text_file(F"{testdir}/f{num}.txt", gentext((8 - num) * KB + 100))
+            sh____(F"{git} add .", testdir)
+            sh____(F"{git} --no-pager commit -m 'change {num}'", testdir)
+            text_file(F"{testdir}/g.txt", gentext(num * 100 + 1))
+            sh____(F"{git} add .", testdir)
+            sh____(F"{git} --no-pager commit -m 'change {num}'", testdir)
+        app.REPO = testdir
+        app.MAXSIZE = MAXSIZE
+        sums = list(app.each_sumsize4())
+        top = list(app.each_sumsize4(top=3))
+        self.assertEqual(top, sorted(sums, key=lambda x: x.disksum, reverse=True)[:3])
+        self.assertEqual(top[0].name, "f0.txt")
+        top = list(app.each_sumsize4(top=1, sort="changes"))
+        self.assertEqual([(item.name, item.changes) for item in top], [("g.txt", 8)])
+        sizes = list(app.each_size5(app.BLOBS))
+        top5 = list(app.each_size5(app.BLOBS, top=4, sort="filesum"))
+        self.assertEqual(top5, sorted(sizes, key=lambda x: x.filesize, reverse=True)[:4])
+        self.assertEqual(list(app.each_extsize4(top=1))[0].ext, ".txt")
+        self.assertEqual(len(list(app.each_top(iter(sizes), 100))), len(sizes))
+        self.assertEqual(list(app.each_top(iter(sizes))), sizes)
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_604_stats(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        sh____(F"{git} init -b {main} {testdir}")
+        for num in range(5):
+            text_file(F"{testdir}/f{num}.txt", gentext(num * KB + 100))
+        sh____(F"{git} add .", testdir)
+        sh____(F"{git} --no-pager commit -m 'initial'", testdir)
+        app.REPO = testdir
+        app.MAXSIZE = MAXSIZE
+        hooked: List[Dict[str, object]] = []
+        app.STATS = True
+        app.STATSFILE = F"{testdir}/stats.json"
+        app.STATSHOOK = hooked.append
+        try:
+            app.reset_stats()
+            sums = list(app.each_sumsize4())
+            app.write_stats()
+        finally:
+            app.STATS = False
+            app.STATSFILE = ""
+            app.STATSHOOK = None
+        self.assertEqual(len(sums), 5)
+        with open(F"{testdir}/stats.json") as f:
+            stats = json.load(f)
+        self.assertEqual(len(hooked), 1)
+        self.assertEqual(sorted(hooked[0]), sorted(stats))
+        phases = stats["phases"]
+        self.assertIn("rev-list", phases)
+        self.assertEqual(phases["cat-file"]["objects"], 5)
+        self.assertEqual(phases["objects"]["objects"], 5)
+        self.assertGreater(phases["cat-file"]["bytes"], 5 * 40)
+        self.assertIn("aggregate", phases)
+        self.assertGreater(stats["maxrss_kb"], 0)
+        text_file(F"{testdir}/\u00e4\u00f6\u00fc.txt", gentext(1 * KB))
+        sh____(F"{git} add .", testdir)
+        sh____(F"{git} --no-pager commit -m 'umlauts'", testdir)
+        listed = subprocess.check_output(F"{git} rev-list --objects {main}", cwd=testdir, shell=True)
+        app.STATS = True
+        try:
+            app.reset_stats()
+            self.assertGreater(len(list(app.each_size5())), 7)
+            self.assertEqual(app.get_stats()["phases"]["rev-list"]["bytes"], len(listed))  # not the decoded length
+        finally:
+            app.STATS = False
+        app.reset_stats()
+        self.assertEqual(app.get_stats()["phases"], {})
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_701_fleet(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        for num in range(3):
+            repo = F"{testdir}/repo{num}.git"
+            sh____(F"{git} init -b {main} {repo}")
+            text_file(F"{repo}/a.txt", gentext(20 * KB))
+            text_file(F"{repo}/r{num}.txt", gentext((num + 1) * 30 * KB))
+            sh____(F"{git} add *.*", repo)
+            sh____(F"{git} --no-pager commit -m 'initial'", repo)
+        app.MAXSIZE = 0.025
+        repos = app.get_fleet_repos([F"{testdir}/repo*.git", F"{testdir}/missing.git"])
+        self.assertEqual(len(repos), 4)
+        app.JOBS = 2
+        try:
+            totals, offenders = app.get_fleet(repos)
+            for total in totals:
+                logg.info("total %s", total)
+            self.assertEqual([total.status for total in totals], ["ok", "ok", "ok", "not found"])
+            self.assertEqual([total.oversize for total in totals], [1, 1, 1, 0])
+            self.assertEqual([total.objects for total in totals], [3, 3, 3, 0])
+            self.assertEqual(offenders[0].repo, F"{testdir}/repo2.git")
+            self.assertEqual(offenders[0].name, "r2.txt")
+            self.assertEqual(offenders[0].filesum, 90 * KB)
+            self.assertEqual(len(offenders), 3 * 2)
+            app.TIMEOUT = 0.001
+            totals, offenders = app.get_fleet(repos[:1])
+            self.assertEqual(totals[0].status, "timeout")
+            self.assertEqual(offenders, [])
+        finally:
+            app.JOBS = 0
+            app.TIMEOUT = 0.0
+        if not KEEP:
+            self.rm_testdir()
+
+    def test_711_serve(self) -> None:
+        testdir = self.mk_testdir()
+        git, main = GIT, BRANCH
+        repo = F"{testdir}/repo.git"
+        sh____(F"{git} init -b {main} {repo}")
+        text_file(F"{repo}/a.txt", gentext(20 * KB))
+        sh____(F"{git} add .", repo)
+        sh____(F"{git} --no-pager commit -m 'initial'", repo)
+        app.MAXSIZE = 0.025
+        warm = app.WarmRepo(repo)
+        self.assertEqual(warm.refresh(), 2)  # tree, blob
+        self.assertEqual(warm.refresh(), -1)
+        rows = warm.query("sumsize")
+        self.assertEqual([(row["name"], row["filesum"]) for row in rows], [("a.txt", 20 * KB)])
+        self.assertEqual(warm.query("oversize"), [])
+        text_file(F"{repo}/b.txt", gentext(30 * KB))
+        sh____(F"{git} add .", repo)
+        sh____(F"{git} --no-pager commit -m 'second'", repo)
+        self.assertEqual(warm.refresh(), 2)  # only the new tree and blob
+        rows = warm.query("sumsize")
+        self.assertEqual(sorted((row["name"], row["filesum"]) for row in rows), [("a.txt", 20 * KB), ("b.txt", 30 * KB)])
+        self.assertEqual([row["name"] for row in warm.query("sumsize", top=1)], ["b.txt"])
+        self.assertEqual(len(warm.query("oversize")), 1)
+        sh____(F"{git} reset -q --hard HEAD~1", repo)
+        self.assertEqual(warm.refresh(), 2)  # rewound and scanned again
+        self.assertEqual([row["name"] for row in warm.query("sumsize")], ["a.txt"])
+        # as a daemon
+        socketfile = F"{testdir}/serve.sock"
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        script = os.path.abspath(app.__file__)
+        options = ["-x", "0.025", "--socket", socketfile, "--port", str(port), "--refresh", "0.1"]
+        cmd = [sys.executable, script] + options + ["serve", repo]
+        daemon = subprocess.Popen(cmd)
+        try:
+            for attempt in range(100):
+                if os.path.exists(socketfile):
+                    break
+                time.sleep(0.05)
+            app.SOCKET = socketfile
+            answer = app.query_server("sumsize")
+            self.assertEqual([row["name"] for row in answer["rows"]], ["a.txt"])
+            self.assertIn("error", app.query_server("unknown"))
+            text_file(F"{repo}/c.txt", gentext(40 * KB))
+            sh____(F"{git} add .", repo)
+            sh____(F"{git} --no-pager commit -m 'third'", repo)
+            for attempt in range(100):
+                answer = app.query_server("oversize", "repo.git")
+                if answer["rows"]:
+                    break
+                time.sleep(0.05)
+            self.assertEqual([row["name"] for row in answer["rows"]], ["c.txt"])
+            with urlopen(F"http://127.0.0.1:{port}/extsize?repo=repo.git") as page:
+                data = json.loads(page.read())
+            self.assertEqual([(row["ext"], row["changes"]) for row in data["rows"]], [(".txt", 2)])
+            with self.assertRaises(HTTPError) as bad:
+                urlopen(F"http://127.0.0.1:{port}/extsize?repo=repo.git&top=many")
+            self.assertEqual(bad.exception.code, 400)
+            bad.exception.close()
+            out, err, rc = output3(F"{sys.executable} {script} --socket {socketfile} -o csv query sumsize")
+            self.assertEqual(rc, 0)
+            self.assertIn("c.txt", out)
+        finally:
+            daemon.terminate()
+            daemon.wait()
+            app.SOCKET = "show-bigfiles.sock"
+            app.MAXSIZE = MAXSIZE
+        self.assertFalse(os.path.exists(socketfile))
+        if not KEEP:
+            self.rm_testdir()
+
 
 def _main_() -> int:
     global KEEP, GIT, BRANCH